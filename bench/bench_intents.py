@@ -0,0 +1,89 @@
+"""
+Per-message cost of the intent router by number of intents.
+
+Builds routers with synthetic intents of five keywords each and measures how
+long matching a free-text message takes, next to the linear `any(keyword in text)`
+scan the router replaced. The router cost should stay flat as intents are added.
+
+Usage:
+    python bench/bench_intents.py --intents 3 30 300 3000 --messages 2000
+"""
+import argparse
+import random
+import string
+import sys
+import time
+
+from harness import ROOT
+
+sys.path.insert(0, ROOT)
+
+from src.intent_router import IntentRouter  # noqa: E402
+
+KEYWORDS_PER_INTENT = 5
+
+
+def random_word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+
+
+def make_intents(count: int, rng: random.Random) -> list[dict]:
+    return [
+        {
+            "name": f"intent_{index}",
+            "priority": index,
+            "keywords": [random_word(rng) for _ in range(KEYWORDS_PER_INTENT)]
+        }
+        for index in range(count)
+    ]
+
+
+def make_messages(intents: list[dict], count: int, rng: random.Random) -> list[str]:
+    """Messages of 12 words, every second one containing a keyword."""
+    messages = []
+    for index in range(count):
+        words = [random_word(rng) for _ in range(12)]
+        if index % 2:
+            words[rng.randrange(len(words))] = rng.choice(rng.choice(intents)["keywords"])
+        messages.append(" ".join(words))
+    return messages
+
+
+def linear_scan(intents: list[dict], text: str) -> str | None:
+    text = text.lower()
+    for intent in intents:
+        if any(keyword in text for keyword in intent["keywords"]):
+            return intent["name"]
+    return None
+
+
+def measure(match, messages: list[str]) -> float:
+    """Return microseconds per message."""
+    started = time.perf_counter()
+    for message in messages:
+        match(message)
+    return (time.perf_counter() - started) / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--intents", type=int, nargs="+", default=[3, 30, 300, 3000])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'intents':>8} {'router us':>10} {'fuzzy us':>10} {'linear us':>10}")
+    for count in args.intents:
+        rng = random.Random(args.seed)
+        intents = make_intents(count, rng)
+        messages = make_messages(intents, args.messages, rng)
+        router = IntentRouter(intents, fuzzy=False)
+        fuzzy_router = IntentRouter(intents, fuzzy=True)
+        exact = measure(router.match, messages)
+        fuzzy = measure(fuzzy_router.match, messages)
+        linear = measure(lambda text: linear_scan(intents, text), messages)
+        print(f"{count:>8} {exact:>10.1f} {fuzzy:>10.1f} {linear:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
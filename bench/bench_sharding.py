@@ -0,0 +1,80 @@
+"""
+Throughput of the sharded multi-worker mode.
+
+Starts the fake Telegram and OpenAI servers, runs the bot with 1, 2, 4, ...
+worker processes against them and measures how fast `/gpt` conversations of
+many chats are answered. Every update also burns `--cpu-ms` of CPU (see
+`cpu_bot.py`): waiting for ChatGPT overlaps within one process thanks to
+`CONCURRENT_UPDATES`, but CPU-bound work is serialized by the interpreter,
+which is what more worker processes relieve. All runs use the default
+`CONCURRENT_UPDATES`, and the single-process mode is the baseline.
+With `--cpu-ms 0` the comparison shows the cost of the front process alone.
+
+Usage:
+    python bench/bench_sharding.py --workers 1 2 4 --chats 64 --messages 3 --llm-latency 0.5 --cpu-ms 20
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from fake_servers import ANSWER_MARKER, FakeOpenAIServer, FakeTelegramServer
+from fake_telegram import make_message_update
+from harness import BotProcess, bot_environment
+
+
+def run(workers: int, chats: int, messages: int, llm_latency: float, cpu_ms: float, timeout: float) -> float:
+    """Return the number of answered messages per second."""
+    with FakeTelegramServer() as telegram, FakeOpenAIServer(latency=llm_latency) as openai, \
+            tempfile.TemporaryDirectory() as state_dir:
+        env = bot_environment(
+            telegram,
+            openai,
+            state_dir,
+            WORKERS=workers,
+            BENCH_CPU_MS=cpu_ms,
+            FACT_POOL_SIZE=0,
+            STREAM_RESPONSES="false"
+        )
+        with BotProcess(telegram, env, script=os.path.join(os.path.dirname(__file__), "cpu_bot.py")):
+            expected = chats * messages
+            started = time.monotonic()
+            for chat_id in range(1, chats + 1):
+                telegram.push_update(make_message_update(chat_id, "/gpt"))
+            for index in range(messages):
+                for chat_id in range(1, chats + 1):
+                    telegram.push_update(make_message_update(chat_id, f"question {index} from chat {chat_id}"))
+
+            while True:
+                answered = sum(ANSWER_MARKER in text for _, text, _ in telegram.replies)
+                if answered >= expected:
+                    break
+                if time.monotonic() - started > timeout:
+                    raise RuntimeError(f"Only {answered} of {expected} messages were answered")
+                time.sleep(0.01)
+            return expected / (time.monotonic() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4],
+                        help="worker counts; 1 is the single-process mode")
+    parser.add_argument("--chats", type=int, default=64)
+    parser.add_argument("--messages", type=int, default=3, help="questions per chat")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per completion")
+    parser.add_argument("--cpu-ms", type=float, default=20, help="CPU milliseconds burned per update")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    baseline = run(1, args.chats, args.messages, args.llm_latency, args.cpu_ms, args.timeout)
+    print(f"{'workers':>8} {'msg/s':>10} {'speedup':>8}")
+    print(f"{'single':>8} {baseline:>10.1f} {1:>7.2f}x")
+    for workers in args.workers:
+        if workers <= 1:
+            continue
+        throughput = run(workers, args.chats, args.messages, args.llm_latency, args.cpu_ms, args.timeout)
+        print(f"{workers:>8} {throughput:>10.1f} {throughput / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+`src/bot.py` with synthetic CPU-bound work in every handler, for `bench_sharding.py`.
+
+Every update burns `BENCH_CPU_MS` milliseconds of CPU before its handler runs.
+It stands in for the pure-Python work of a bot (parsing, rendering, tokenizing),
+which one interpreter cannot spread over cores however many updates it runs
+concurrently.
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "src")]
+
+import bot  # noqa: E402
+
+CPU_SECONDS = float(os.getenv("BENCH_CPU_MS", "0")) / 1000
+
+_build_application = bot.build_application
+
+
+def burn_cpu() -> None:
+    deadline = time.thread_time() + CPU_SECONDS
+    while time.thread_time() < deadline:
+        pass
+
+
+def with_cpu_work(callback):
+    async def wrapper(update, context, *args):
+        burn_cpu()
+        return await callback(update, context, *args)
+
+    return wrapper
+
+
+def build_application(**kwargs):
+    app = _build_application(**kwargs)
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            handler.callback = with_cpu_work(handler.callback)
+    return app
+
+
+if __name__ == "__main__":
+    # worker processes of the sharded mode receive this function and build their applications with it
+    bot.build_application = build_application
+    bot.main()
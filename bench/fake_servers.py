@@ -0,0 +1,268 @@
+"""
+Local stand-in servers for the Telegram Bot API and the OpenAI chat completions API.
+
+Both run in a background thread, answer with realistic payloads and support
+configurable latency and error injection, so the bot can be load tested offline:
+point TELEGRAM_API_URL to `FakeTelegramServer.api_url` and OPENAI_BASE_URL to
+`FakeOpenAIServer.base_url`.
+"""
+import email.parser
+import email.policy
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+ANSWER_MARKER = "FAKE-ANSWER"
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def handle_error(self, request, client_address):
+        # clients closing keep-alive connections are expected when the bot stops
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class _FakeServer:
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self._httpd = _Server(("127.0.0.1", 0), self._handler_class())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _inject(self) -> bool:
+        """Sleep for the configured latency and tell whether this request should fail."""
+        if self.latency:
+            time.sleep(self.latency)
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # send headers and body in one packet, otherwise delayed ACKs add ~40ms per request
+            wbufsize = -1
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                try:
+                    server.handle(self, body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client went away, e.g. the bot was stopped during a long poll
+                    self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status: int, payload) -> None:
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def handle(self, request, body: bytes) -> None:
+        raise NotImplementedError
+
+
+def _parse_params(content_type: str, body: bytes) -> dict:
+    """Decode Bot API parameters sent as JSON, a form or multipart data."""
+    if content_type.startswith("application/json"):
+        return json.loads(body or b"{}")
+    if content_type.startswith("multipart/form-data"):
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body
+        )
+        raw = {
+            part.get_param("name", header="content-disposition"): part.get_content()
+            for part in message.iter_parts()
+            if not part.get_filename()
+        }
+    else:
+        raw = {key: values[0] for key, values in parse_qs(body.decode("utf-8")).items()}
+    params = {}
+    for key, value in raw.items():
+        try:
+            params[key] = json.loads(value)
+        except (TypeError, ValueError):
+            params[key] = value
+    return params
+
+
+class FakeTelegramServer(_FakeServer):
+    """
+    Minimal Bot API server.
+    Updates added with `push_update` are served by `getUpdates`; every other call
+    is recorded in `calls` and answered like Telegram would. Messages with an
+    inline keyboard are recorded in `replies` as `(chat_id, text, time)`.
+    Functions in `listeners` are called as `listener(method, params, time)` for
+    every call except `getUpdates`.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0):
+        super().__init__(latency, error_rate)
+        self.calls = Counter()
+        self.replies = []
+        self._updates = []
+        self._condition = threading.Condition()
+        self._message_ids = itertools.count(1000)
+        self._file_ids = itertools.count(1)
+        self._update_ids = itertools.count(1)
+        self.listeners = []
+
+    @property
+    def api_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    def push_update(self, update: dict) -> None:
+        with self._condition:
+            # ids are assigned on push, so updates built earlier are never behind the polling offset
+            update["update_id"] = next(self._update_ids)
+            self._updates.append(update)
+            self._condition.notify_all()
+
+    def handle(self, request, body: bytes) -> None:
+        method = request.path.rsplit("/", 1)[-1]
+        params = _parse_params(request.headers.get("Content-Type", ""), body)
+        if method == "getUpdates":
+            request.send_json(200, {"ok": True, "result": self._get_updates(params)})
+            return
+        if self._inject():
+            request.send_json(500, {"ok": False, "error_code": 500, "description": "Internal Server Error"})
+            return
+        with self._condition:
+            self.calls[method] += 1
+        result = self._result(method, params)
+        request.send_json(200, {"ok": True, "result": result})
+        now = time.monotonic()
+        for listener in self.listeners:
+            listener(method, params, now)
+
+    def _get_updates(self, params: dict) -> list:
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                self._updates = [update for update in self._updates if update["update_id"] >= offset]
+                remaining = deadline - time.monotonic()
+                if self._updates or remaining <= 0:
+                    return self._updates[:100]
+                self._condition.wait(remaining)
+
+    def _result(self, method: str, params: dict):
+        chat_id = params.get("chat_id")
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Fake bot", "username": "fake_bot"}
+        if method not in ("sendMessage", "sendPhoto", "editMessageText", "editMessageCaption"):
+            return True
+        message_id = params.get("message_id") or next(self._message_ids)
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+        }
+        text = params.get("text") or params.get("caption") or ""
+        if method == "sendPhoto":
+            file_id = next(self._file_ids)
+            message["photo"] = [{"file_id": f"photo-{file_id}", "file_unique_id": f"u{file_id}", "width": 1,
+                                 "height": 1}]
+            message["caption"] = text
+        else:
+            message["text"] = text
+        if params.get("reply_markup"):
+            now = time.monotonic()
+            with self._condition:
+                self.replies.append((chat_id, text, now))
+        return message
+
+
+class FakeOpenAIServer(_FakeServer):
+    """
+    Minimal chat completions server.
+    Every answer contains `ANSWER_MARKER`; streamed answers are sent as
+    server-sent events in `stream_chunks` parts.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, stream_chunks: int = 5):
+        super().__init__(latency, error_rate)
+        self.stream_chunks = stream_chunks
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def handle(self, request, body: bytes) -> None:
+        payload = json.loads(body or b"{}")
+        with self._lock:
+            self.requests += 1
+            number = self.requests
+        if self._inject():
+            request.send_json(500, {"error": {"message": "Injected failure", "type": "server_error"}})
+            return
+        question = payload["messages"][-1]["content"]
+        answer = f"{ANSWER_MARKER} #{number}: an answer to '{question[:40]}'"
+        if payload.get("stream"):
+            self._stream(request, answer)
+            return
+        request.send_json(200, {
+            "id": f"chatcmpl-{number}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "gpt-3.5-turbo"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+        })
+
+    def _stream(self, request, answer: str) -> None:
+        request.send_response(200)
+        request.send_header("Content-Type", "text/event-stream")
+        request.send_header("Connection", "close")
+        request.end_headers()
+        size = max(len(answer) // self.stream_chunks, 1)
+        for start in range(0, len(answer), size):
+            chunk = {
+                "id": "chatcmpl-stream",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": "gpt-3.5-turbo",
+                "choices": [{"index": 0, "delta": {"content": answer[start:start + size]}, "finish_reason": None}],
+            }
+            request.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            request.wfile.flush()
+        request.wfile.write(b"data: [DONE]\n\n")
+        request.close_connection = True
@@ -0,0 +1,85 @@
+"""
+Fake Telegram sender for local testing of the webhook mode.
+
+Posts synthetic updates to the bot webhook the same way Telegram does, including
+the X-Telegram-Bot-Api-Secret-Token header.
+
+Usage:
+    python bench/fake_telegram.py --url http://127.0.0.1:8443/telegram --secret <WEBHOOK_SECRET> --text /start
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+import httpx
+
+_update_ids = itertools.count(1)
+
+
+def make_message_update(chat_id: int, text: str) -> dict:
+    update_id = next(_update_ids)
+    user = {"id": chat_id, "is_bot": False, "first_name": f"User {chat_id}"}
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private", "first_name": user["first_name"]},
+        "from": user,
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def make_callback_update(chat_id: int, data: str) -> dict:
+    update_id = next(_update_ids)
+    user = {"id": chat_id, "is_bot": False, "first_name": f"User {chat_id}"}
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": user,
+            "chat_instance": str(chat_id),
+            "data": data,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private", "first_name": user["first_name"]},
+                "text": "",
+            },
+        },
+    }
+
+
+async def send_update(client: httpx.AsyncClient, url: str, update: dict, secret: str | None = None) -> int:
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    response = await client.post(url, json=update, headers=headers)
+    return response.status_code
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Post fake Telegram updates to the bot webhook")
+    parser.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    parser.add_argument("--secret", default=None)
+    parser.add_argument("--text", default="/start")
+    parser.add_argument("--chats", type=int, default=1, help="number of distinct chats")
+    parser.add_argument("--count", type=int, default=1, help="updates per chat")
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient() as client:
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(
+            send_update(client, args.url, make_message_update(chat_id, args.text), args.secret)
+            for chat_id in range(1, args.chats + 1)
+            for _ in range(args.count)
+        ))
+        elapsed = time.perf_counter() - started
+
+    for status in sorted(set(statuses)):
+        print(f"HTTP {status}: {statuses.count(status)}")
+    print(f"{len(statuses)} updates in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
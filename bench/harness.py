@@ -0,0 +1,96 @@
+"""Helpers to run `src/bot.py` as a subprocess against the fake servers."""
+import os
+import subprocess
+import sys
+import time
+
+from fake_servers import FakeOpenAIServer, FakeTelegramServer
+
+ROOT = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))
+
+
+def bot_environment(telegram: FakeTelegramServer, openai: FakeOpenAIServer, state_dir: str, **overrides) -> dict:
+    """Environment for a bot talking to the fake servers, with flood limits lifted."""
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": ROOT,
+        "BOT_TOKEN": "123456:FAKE",
+        "CHATGPT_TOKEN": "fake",
+        "TELEGRAM_API_URL": telegram.api_url,
+        "OPENAI_BASE_URL": openai.base_url,
+        "OPENAI_PROXY": "",
+        "BOT_MODE": "polling",
+        "WORKERS": "1",
+        "RATE_LIMIT_GLOBAL": "100000",
+        "RATE_LIMIT_PER_CHAT": "100000",
+        "RATE_LIMIT_PER_GROUP": "100000",
+        "MEDIA_CACHE_PATH": os.path.join(state_dir, "media_cache.json"),
+        "PERSISTENCE_BACKEND": "",
+    })
+    env.update({key: str(value) for key, value in overrides.items()})
+    return env
+
+
+class BotProcess:
+    """
+    `src/bot.py`, or another `script` that runs it, started in a subprocess;
+    entering the context waits until it is ready.
+    """
+
+    def __init__(self, telegram: FakeTelegramServer, env: dict, startup_timeout: float = 120,
+                 script: str = os.path.join(ROOT, "src", "bot.py")):
+        self.telegram = telegram
+        self.env = env
+        self.startup_timeout = startup_timeout
+        self.script = script
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, self.script],
+            env=self.env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        # ready when the updates receiver is polling and every process has initialized (called getMe)
+        workers = int(self.env.get("WORKERS", "1"))
+        processes = workers + 1 if workers > 1 else 1
+        deadline = time.monotonic() + self.startup_timeout
+        while self.telegram.calls["deleteWebhook"] == 0 or self.telegram.calls["getMe"] < processes:
+            if self.process.poll() is not None:
+                raise RuntimeError("The bot exited during startup")
+            if time.monotonic() > deadline:
+                raise RuntimeError("The bot did not start in time")
+            time.sleep(0.05)
+        time.sleep(0.5)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+    def rss(self) -> int:
+        """Resident memory of the bot and its worker processes in bytes (Linux only)."""
+        return sum(_rss(pid) for pid in [self.process.pid, *_children(self.process.pid)])
+
+
+def _children(pid: int) -> list[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as file:
+            return [int(child) for child in file.read().split()]
+    except OSError:
+        return []
+
+
+def _rss(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
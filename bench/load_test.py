@@ -0,0 +1,256 @@
+"""
+Offline load test of the bot.
+
+Starts the fake Telegram and OpenAI servers, runs `src/bot.py` against them and
+drives synthetic users through the /start, /random, /gpt, /talk, /quiz and
+/english flows. Reports p50/p95/p99 latency per step, updates per second and
+memory per active user. Results can be saved as JSON and compared with the
+results of another commit.
+
+Usage:
+    python bench/load_test.py --users 50 --rounds 2 --llm-latency 0.5 --output results.json
+    python bench/load_test.py --users 50 --rounds 2 --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+
+from fake_servers import ANSWER_MARKER, FakeOpenAIServer, FakeTelegramServer
+from fake_telegram import make_callback_update, make_message_update
+from harness import ROOT, BotProcess, bot_environment
+
+REPLY_METHODS = {"sendMessage", "sendPhoto", "editMessageText", "editMessageCaption"}
+
+
+def reply(marker: str | None = None):
+    """A message with an inline keyboard, optionally containing `marker`."""
+    def predicate(method: str, params: dict) -> bool:
+        if method not in REPLY_METHODS or not params.get("reply_markup"):
+            return False
+        return marker is None or marker in (params.get("text") or params.get("caption") or "")
+    return predicate
+
+
+def text_reply(*prefixes: str):
+    def predicate(method: str, params: dict) -> bool:
+        return method == "sendMessage" and (params.get("text") or "").startswith(prefixes)
+    return predicate
+
+
+def call(expected_method: str):
+    def predicate(method: str, params: dict) -> bool:
+        return method == expected_method
+    return predicate
+
+
+def buttons(params: dict) -> list[dict]:
+    markup = params.get("reply_markup") or {}
+    return [button for row in markup.get("inline_keyboard", []) for button in row]
+
+
+def percentile(values: list[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class LoadTest:
+    """Sends updates to the fake Telegram server and measures how long the bot takes to answer."""
+
+    def __init__(self, telegram: FakeTelegramServer, timeout: float, think_time: float):
+        self.telegram = telegram
+        self.timeout = timeout
+        self.think_time = think_time
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.updates = 0
+        self._waiters = defaultdict(list)
+        self._loop = None
+
+    async def run(self, users: int, rounds: int) -> float:
+        self._loop = asyncio.get_running_loop()
+        self.telegram.listeners.append(self._on_call)
+        started = time.monotonic()
+        await asyncio.gather(*(self.user_session(chat_id, rounds) for chat_id in range(1, users + 1)))
+        return time.monotonic() - started
+
+    async def user_session(self, chat_id: int, rounds: int) -> None:
+        flows = [self.flow_start, self.flow_random, self.flow_gpt, self.flow_talk, self.flow_quiz, self.flow_english]
+        await asyncio.sleep(random.random() * self.think_time)
+        for round_index in range(rounds):
+            for flow in flows:
+                try:
+                    await flow(chat_id, round_index)
+                except (asyncio.TimeoutError, LookupError):
+                    pass
+
+    async def flow_start(self, chat_id: int, round_index: int) -> None:
+        await self.step("start", chat_id, make_message_update(chat_id, "/start"), call("sendPhoto"))
+
+    async def flow_random(self, chat_id: int, round_index: int) -> None:
+        await self.step("random", chat_id, make_message_update(chat_id, "/random"), reply(ANSWER_MARKER))
+
+    async def flow_gpt(self, chat_id: int, round_index: int) -> None:
+        await self.step("gpt", chat_id, make_message_update(chat_id, "/gpt"), reply())
+        question = f"Question {round_index} from user {chat_id}"
+        await self.step("gpt_answer", chat_id, make_message_update(chat_id, question), reply(ANSWER_MARKER))
+
+    async def flow_talk(self, chat_id: int, round_index: int) -> None:
+        menu = await self.step("talk", chat_id, make_message_update(chat_id, "/talk"), reply())
+        personality = buttons(menu)[0]["callback_data"]
+        await self.step("talk_pick", chat_id, make_callback_update(chat_id, personality), reply())
+        question = f"What do you think about topic {round_index} of user {chat_id}?"
+        await self.step("talk_answer", chat_id, make_message_update(chat_id, question), reply(ANSWER_MARKER))
+
+    async def flow_quiz(self, chat_id: int, round_index: int) -> None:
+        question = await self.step("quiz", chat_id, make_message_update(chat_id, "/quiz"), reply())
+        answer = buttons(question)[0]["callback_data"]
+        await self.step("quiz_answer", chat_id, make_callback_update(chat_id, answer), text_reply("✅", "❌"))
+        next_button = next(button for button in buttons(question) if button["text"] == "Next")
+        await self.step("quiz_next", chat_id, make_callback_update(chat_id, next_button["callback_data"]), reply())
+
+    async def flow_english(self, chat_id: int, round_index: int) -> None:
+        await self.step("english", chat_id, make_message_update(chat_id, "/english"), reply())
+        await self.step("english_guess", chat_id, make_message_update(chat_id, "guess"), reply())
+
+    async def step(self, name: str, chat_id: int, update: dict, predicate) -> dict:
+        """Send an update and wait for the call that completes the step; returns its parameters."""
+        if self.think_time:
+            await asyncio.sleep(random.random() * self.think_time)
+        future = self._loop.create_future()
+        self._waiters[chat_id].append((predicate, future))
+        started = time.monotonic()
+        self.updates += 1
+        self.telegram.push_update(update)
+        try:
+            params, finished = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.errors[name] += 1
+            self._waiters[chat_id] = [waiter for waiter in self._waiters[chat_id] if waiter[1] is not future]
+            raise
+        self.latencies[name].append(finished - started)
+        return params
+
+    def _on_call(self, method: str, params: dict, now: float) -> None:
+        self._loop.call_soon_threadsafe(self._dispatch, method, params, now)
+
+    def _dispatch(self, method: str, params: dict, now: float) -> None:
+        chat_id = params.get("chat_id")
+        waiters = self._waiters.get(chat_id)
+        if not waiters:
+            return
+        for waiter in waiters:
+            predicate, future = waiter
+            if not future.done() and predicate(method, params):
+                future.set_result((params, now))
+                waiters.remove(waiter)
+                return
+
+
+def summarize(test: LoadTest, elapsed: float, users: int, memory: int, upstream: dict) -> dict:
+    steps = {}
+    for name, values in test.latencies.items():
+        steps[name] = {
+            "count": len(values),
+            "errors": test.errors.get(name, 0),
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+        }
+    everything = [value for values in test.latencies.values() for value in values]
+    return {
+        "users": users,
+        "elapsed_s": elapsed,
+        "updates": test.updates,
+        "updates_per_s": test.updates / elapsed if elapsed else 0.0,
+        "errors": sum(test.errors.values()),
+        "p50_ms": percentile(everything, 50) * 1000,
+        "p95_ms": percentile(everything, 95) * 1000,
+        "p99_ms": percentile(everything, 99) * 1000,
+        "memory_per_user_kib": memory / users / 1024,
+        "upstream": upstream,
+        "steps": steps,
+    }
+
+
+def print_report(result: dict, baseline: dict | None = None) -> None:
+    def delta(key: str, values: dict, base: dict | None) -> str:
+        if not base or key not in base or not base[key]:
+            return ""
+        return f" ({(values[key] - base[key]) / base[key] * 100:+.0f}%)"
+
+    print(f"{'step':<14} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>16} {'p99 ms':>9}")
+    for name, step in sorted(result["steps"].items()):
+        base = (baseline or {}).get("steps", {}).get(name)
+        print(f"{name:<14} {step['count']:>6} {step['errors']:>6} {step['p50_ms']:>9.1f} "
+              f"{step['p95_ms']:>8.1f}{delta('p95_ms', step, base):>8} {step['p99_ms']:>9.1f}")
+    print()
+    print(f"latency p50/p95/p99: {result['p50_ms']:.1f} / {result['p95_ms']:.1f}{delta('p95_ms', result, baseline)}"
+          f" / {result['p99_ms']:.1f} ms")
+    print(f"throughput: {result['updates_per_s']:.1f} updates/s{delta('updates_per_s', result, baseline)}"
+          f" ({result['updates']} updates, {result['errors']} errors)")
+    print(f"memory per active user: {result['memory_per_user_kib']:.1f} KiB"
+          f"{delta('memory_per_user_kib', result, baseline)}")
+    print(f"upstream calls: {result['upstream']}")
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the bot")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=1, help="times every user goes through all flows")
+    parser.add_argument("--think-time", type=float, default=0.2, help="max random pause before each step")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--telegram-latency", type=float, default=0.0)
+    parser.add_argument("--telegram-error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=30, help="seconds to wait for the answer of a step")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--env", nargs="*", default=[], metavar="KEY=VALUE", help="extra bot settings")
+    parser.add_argument("--output", help="save results as JSON")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare with")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    telegram = FakeTelegramServer(args.telegram_latency, args.telegram_error_rate)
+    openai = FakeOpenAIServer(args.llm_latency, args.llm_error_rate)
+    with telegram, openai, tempfile.TemporaryDirectory() as state_dir:
+        overrides = dict(item.split("=", 1) for item in args.env)
+        with BotProcess(telegram, bot_environment(telegram, openai, state_dir, **overrides)) as bot:
+            memory_before = bot.rss()
+            test = LoadTest(telegram, args.timeout, args.think_time)
+            elapsed = asyncio.run(test.run(args.users, args.rounds))
+            memory = max(bot.rss() - memory_before, 0)
+        upstream = {"bot_api": sum(telegram.calls.values()), "llm": openai.requests}
+
+    result = summarize(test, elapsed, args.users, memory, upstream)
+    result["commit"] = current_commit()
+    result["settings"] = vars(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+        print(f"comparing {result['commit']} with {baseline.get('commit', 'unknown')}\n")
+    print_report(result, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(result, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,142 @@
+import asyncio
+import logging
+import multiprocessing
+
 from telegram import Update
-from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler, MessageHandler, filters
+from telegram.ext import ApplicationBuilder, Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters
 
-from config import BOT_TOKEN
+from config import (BOT_TOKEN, RESOURCES_HOT_RELOAD, FACT_POOL_SIZE, BOT_MODE, CONCURRENT_UPDATES, WEBHOOK_LISTEN,
+                    WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL, WEBHOOK_SECRET, RATE_LIMIT_GLOBAL, RATE_LIMIT_PER_CHAT,
+                    RATE_LIMIT_PER_GROUP, RATE_LIMIT_BURST, TELEGRAM_API_URL, WORKERS, CHAT_QUEUE_DEPTH, METRICS_HOST,
+                    METRICS_PORT)
 from handlers import start, random, gpt, message_handler, talk, close_button, random_button, talk_button
+from src.callbacks import (CallbackRouter, MODE_MENU, MODE_RANDOM, MODE_TALK, MODE_QUIZ, MODE_ENGLISH, ACTION_CLOSE,
+                           ACTION_NEXT, ACTION_PICK, ACTION_ANSWER)
 from src.english import english, english_button
-from src.quiz import quiz_button, quiz
-
-app = ApplicationBuilder().token(BOT_TOKEN).build()
-app.add_handler(CommandHandler("start", start))
-app.add_handler(CommandHandler("random", random))
-app.add_handler(CommandHandler("gpt", gpt))
-app.add_handler(CommandHandler("talk", talk))
-app.add_handler(CommandHandler("quiz", quiz))
-app.add_handler(CommandHandler("english", english))
-app.add_handler(CallbackQueryHandler(english_button, pattern="^eng_"))
-app.add_handler(CallbackQueryHandler(quiz_button, pattern="^quiz_"))
-app.add_handler(CallbackQueryHandler(close_button, pattern="^start$"))
-app.add_handler(CallbackQueryHandler(random_button, pattern='^random$'))
-app.add_handler(
-    CallbackQueryHandler(talk_button, pattern='^(talk_linus_torvalds|talk_guido_van_rossum|talk_mark_zuckerberg)$'))
-app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, message_handler))
-
-app.run_polling(drop_pending_updates=True, allowed_updates=Update.ALL_TYPES)
+from src.quiz import quiz_answer, quiz_next, quiz
+from src.fact_pool import fact_pool
+from src.gpt import chatgpt_service
+from src.metrics import metrics, instrument_handler, serve_metrics
+from src.persistence import create_persistence
+from src.quotas import quotas
+from src.rate_limiter import OutboundRateLimiter
+from src.resource_registry import resources
+from src.sharding import run_sharded
+from src.update_processor import PerChatUpdateProcessor
+from src.word_bank import word_bank
+
+logger = logging.getLogger(__name__)
+
+background_tasks = []
+
+# Telegram's flood limit is per bot, so the worker processes of the sharded mode split the global rate
+rate_limiter = OutboundRateLimiter(RATE_LIMIT_GLOBAL / max(WORKERS, 1), RATE_LIMIT_PER_CHAT, RATE_LIMIT_PER_GROUP,
+                                   RATE_LIMIT_BURST)
+
+metrics.gauge("telegram_queue_depth", "Bot API requests waiting for the rate limiter",
+              lambda: {(queue,): rate_limiter.stats()[f"{queue}_queue"] for queue in ("global", "chat")}, ("queue",))
+metrics.gauge("bot_sessions", "Open ChatGPT conversation sessions", lambda: len(chatgpt_service.sessions))
+metrics.gauge("bot_fact_pool_size", "Pregenerated random facts", lambda: len(fact_pool.facts))
+
+
+def metrics_port() -> int:
+    # worker processes of the sharded mode are named "worker-<index>" and serve on consecutive ports
+    name = multiprocessing.current_process().name
+    if name.startswith("worker-"):
+        return METRICS_PORT + int(name.removeprefix("worker-"))
+    return METRICS_PORT
+
+
+async def post_init(application: Application) -> None:
+    await quotas.load()
+    await asyncio.to_thread(word_bank.load)
+    background_tasks.append(asyncio.create_task(quotas.run()))
+    if RESOURCES_HOT_RELOAD:
+        background_tasks.append(asyncio.create_task(resources.watch()))
+    if FACT_POOL_SIZE > 0:
+        background_tasks.append(asyncio.create_task(fact_pool.run()))
+    if METRICS_PORT > 0:
+        background_tasks.append(asyncio.create_task(serve_metrics(METRICS_HOST, metrics_port())))
+
+
+async def post_shutdown(application: Application) -> None:
+    for task in background_tasks:
+        task.cancel()
+    await quotas.close()
+    logger.info(f"Response cache: {chatgpt_service.cache.stats()}")
+    logger.info(f"Outgoing requests: {rate_limiter.stats()}")
+
+
+def build_application(with_updater: bool = True) -> Application:
+    """
+    Create the bot application with all handlers registered.
+    Workers of the sharded mode receive updates from the front process and
+    are built without an updater.
+    """
+    builder = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .base_url(TELEGRAM_API_URL)
+        .concurrent_updates(PerChatUpdateProcessor(CONCURRENT_UPDATES, CHAT_QUEUE_DEPTH))
+        .rate_limiter(rate_limiter)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if not with_updater:
+        builder.updater(None)
+    persistence = create_persistence()
+    if persistence is not None:
+        builder.persistence(persistence)
+    app = builder.build()
+    app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("random", random))
+    app.add_handler(CommandHandler("gpt", gpt))
+    app.add_handler(CommandHandler("talk", talk))
+    app.add_handler(CommandHandler("quiz", quiz))
+    app.add_handler(CommandHandler("english", english))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, message_handler))
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            handler.callback = instrument_handler(handler.callback)
+
+    # all inline buttons go through one handler that dispatches by the decoded callback_data
+    callback_router = CallbackRouter()
+    callback_router.register(MODE_MENU, ACTION_CLOSE, close_button)
+    callback_router.register(MODE_RANDOM, ACTION_NEXT, random_button)
+    callback_router.register(MODE_TALK, ACTION_PICK, talk_button)
+    callback_router.register(MODE_QUIZ, ACTION_ANSWER, quiz_answer)
+    callback_router.register(MODE_QUIZ, ACTION_NEXT, quiz_next)
+    callback_router.register(MODE_ENGLISH, ACTION_NEXT, english_button)
+    callback_router.wrap(instrument_handler)
+    app.add_handler(CallbackQueryHandler(callback_router.dispatch))
+    return app
+
+
+def main():
+    if WORKERS > 1:
+        # a front process receives updates and routes them by chat to worker processes
+        run_sharded(build_application, WORKERS)
+        return
+
+    if BOT_MODE == "webhook" and not WEBHOOK_URL:
+        # without it python-telegram-bot registers its plain http listen address, which Telegram rejects
+        raise ValueError("WEBHOOK_URL must be set to the public HTTPS URL of the bot in webhook mode")
+    app = build_application()
+    if BOT_MODE == "webhook":
+        # updates are received by the embedded HTTP server; requests without the
+        # matching X-Telegram-Bot-Api-Secret-Token header are rejected
+        app.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET or None,
+            drop_pending_updates=True,
+            allowed_updates=Update.ALL_TYPES
+        )
+    else:
+        app.run_polling(drop_pending_updates=True, allowed_updates=Update.ALL_TYPES)
+
+
+if __name__ == "__main__":
+    main()
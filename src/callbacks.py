@@ -0,0 +1,85 @@
+import base64
+import binascii
+import logging
+import struct
+from typing import Awaitable, Callable
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+# version of the callback_data layout, buttons of other versions are rejected as expired
+CALLBACK_VERSION = 1
+# version, mode, action and a 16-bit index
+_LAYOUT = struct.Struct(">BBBH")
+# base64 without padding
+_ENCODED_LENGTH = -(-_LAYOUT.size * 4 // 3)
+
+# modes
+MODE_MENU = 0
+MODE_RANDOM = 1
+MODE_TALK = 2
+MODE_QUIZ = 3
+MODE_ENGLISH = 4
+
+# actions
+ACTION_CLOSE = 0
+ACTION_NEXT = 1
+ACTION_PICK = 2
+ACTION_ANSWER = 3
+
+EXPIRED_TEXT = "This button has expired."
+
+CallbackHandler = Callable[[Update, ContextTypes.DEFAULT_TYPE, int], Awaitable[None]]
+
+
+def encode(mode: int, action: int, index: int = 0) -> str:
+    """Pack a button into 7 characters of callback_data, far below the 64 bytes Telegram allows."""
+    packed = _LAYOUT.pack(CALLBACK_VERSION, mode, action, index)
+    return base64.urlsafe_b64encode(packed).rstrip(b"=").decode("ascii")
+
+
+def decode(data: str | None) -> tuple[int, int, int] | None:
+    """Return `(mode, action, index)` of callback_data made by `encode`, or None for any other data."""
+    if not data or len(data) != _ENCODED_LENGTH:
+        return None
+    try:
+        version, mode, action, index = _LAYOUT.unpack(base64.urlsafe_b64decode(data + "=" * (-len(data) % 4)))
+    except (binascii.Error, ValueError, struct.error):
+        return None
+    if version != CALLBACK_VERSION:
+        return None
+    return mode, action, index
+
+
+class CallbackRouter:
+    """
+    Single entry point for all inline button presses.
+    Buttons carry `encode`d callback_data; `dispatch` decodes it and calls the
+    handler registered for its mode and action with the index of the button,
+    so dispatch is one table lookup however many handlers there are.
+    The callback query is answered here, before the handler runs.
+    """
+
+    def __init__(self):
+        self.handlers: dict[tuple[int, int], CallbackHandler] = {}
+
+    def register(self, mode: int, action: int, handler: CallbackHandler) -> None:
+        self.handlers[(mode, action)] = handler
+
+    def wrap(self, wrapper: Callable[[CallbackHandler], CallbackHandler]) -> None:
+        """Replace every registered handler with `wrapper(handler)`."""
+        self.handlers = {key: wrapper(handler) for key, handler in self.handlers.items()}
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        query = update.callback_query
+        decoded = decode(query.data)
+        handler = self.handlers.get(decoded[:2]) if decoded else None
+        if handler is None:
+            # buttons of old messages or of a previous callback_data version
+            await query.answer(EXPIRED_TEXT)
+            return
+        await query.answer()
+        await handler(update, context, decoded[2])
+
@@ -0,0 +1,123 @@
+import re
+
+# Telegram limit of message texts
+MESSAGE_LIMIT = 4096
+
+FENCE = "```"
+_CLOSING_FENCE = "\n" + FENCE
+# a line that opens or closes a code block: the fence and an optional language name
+_FENCE_LINE_RE = re.compile(r"\s*```[\w+#-]{0,32}\s*")
+
+# cut positions from the most to the least preferred
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_LINE_RE = re.compile(r"\n")
+_SENTENCE_RE = re.compile(r"[.!?]\s")
+_SPACE_RE = re.compile(r"\s")
+
+
+def _code_ranges(text: str) -> list[tuple[int, int, str]]:
+    """`(start, end, opening fence)` of the fenced code blocks of `text`; an unclosed block runs to the end."""
+    ranges = []
+    opened = None
+    position = 0
+    for line in text.splitlines(keepends=True):
+        if _FENCE_LINE_RE.fullmatch(line):
+            if opened is None:
+                opened = (position, line.strip())
+            else:
+                ranges.append((opened[0], position + len(line), opened[1]))
+                opened = None
+        position += len(line)
+    if opened is not None:
+        ranges.append((opened[0], len(text), opened[1]))
+    return ranges
+
+
+def _code_block_at(ranges: list[tuple[int, int, str]], position: int) -> tuple[int, int, str] | None:
+    for code_range in ranges:
+        if code_range[0] < position < code_range[1]:
+            return code_range
+    return None
+
+
+def _find_cut(text: str, limit: int) -> tuple[int, tuple[int, int, str] | None]:
+    """Best position to cut `text` into a first chunk of at most `limit` characters, and the code block it is in."""
+    ranges = _code_ranges(text)
+    shortest = limit // 2
+
+    def fits(position: int, block) -> bool:
+        return shortest <= position <= (limit - len(_CLOSING_FENCE) if block else limit)
+
+    # paragraphs and the edges of code blocks
+    candidates = [match.end() for match in _PARAGRAPH_RE.finditer(text, 0, limit + 1)]
+    candidates += [edge for start, end, _ in ranges for edge in (start, end)]
+    cuts = [position for position in candidates if fits(position, None) and not _code_block_at(ranges, position)]
+    if cuts:
+        return max(cuts), None
+    # lines outside of code, then lines inside code, which is closed and reopened around the cut
+    lines = [match.end() for match in _LINE_RE.finditer(text, 0, limit + 1)]
+    for inside_code in (False, True):
+        cuts = [
+            position for position in lines
+            if bool(_code_block_at(ranges, position)) == inside_code and fits(position, inside_code)
+        ]
+        if cuts:
+            position = max(cuts)
+            return position, _code_block_at(ranges, position)
+    for pattern in (_SENTENCE_RE, _SPACE_RE):
+        cuts = [match.end() for match in pattern.finditer(text, 0, limit + 1)]
+        cuts = [position for position in cuts if fits(position, _code_block_at(ranges, position))]
+        if cuts:
+            position = max(cuts)
+            return position, _code_block_at(ranges, position)
+    block = _code_block_at(ranges, limit - len(_CLOSING_FENCE))
+    position = limit - len(_CLOSING_FENCE) if block else limit
+    return position, block
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> list[str]:
+    """
+    Split a text into chunks of at most `limit` characters.
+    Chunks end at paragraph and code block boundaries where possible, then at
+    line, sentence and word boundaries. A code block that has to be split is
+    closed at the end of a chunk and reopened with its language at the start
+    of the next one, so every chunk renders on its own.
+    Every pass shortens the remaining text, so the loop always ends.
+    """
+    chunks = []
+    while len(text) > limit:
+        position, block = _find_cut(text, limit)
+        reopen = f"{block[2]}\n" if block else ""
+        if position <= len(reopen):
+            # reopening the block would not leave the rest any shorter
+            position, block, reopen = limit, None, ""
+        chunk, text = text[:position].rstrip(), text[position:]
+        if block:
+            chunk += _CLOSING_FENCE
+            text = reopen + text
+        else:
+            text = text.lstrip("\n")
+        if chunk:
+            chunks.append(chunk)
+    if text.strip():
+        chunks.append(text)
+    return chunks
+
+
+def is_balanced_markdown(text: str) -> bool:
+    """
+    True if every entity of Telegram's (legacy) Markdown in `text` is closed,
+    so the text can be sent with `ParseMode.MARKDOWN` without a parse error.
+    """
+    parts = text.split(FENCE)
+    if len(parts) % 2 == 0:
+        return False
+    # text outside of code blocks
+    for part in parts[::2]:
+        inline = part.split("`")
+        if len(inline) % 2 == 0:
+            return False
+        outside = "".join(inline[::2])
+        if outside.count("*") % 2 or outside.count("_") % 2 or outside.count("[") != outside.count("]"):
+            return False
+    return True
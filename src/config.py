@@ -5,4 +5,115 @@ from dotenv import load_dotenv
 load_dotenv()
 
 CHATGPT_TOKEN = os.getenv("CHATGPT_TOKEN")
-BOT_TOKEN = os.getenv("BOT_TOKEN")
\ No newline at end of file
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+
+# maximum number of ChatGPT completions in flight at the same time
+GPT_MAX_CONCURRENCY = int(os.getenv("GPT_MAX_CONCURRENCY", "100"))
+
+# per-chat conversation sessions
+SESSION_MAX_CHATS = int(os.getenv("SESSION_MAX_CHATS", "10000"))
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
+SESSION_MAX_HISTORY = int(os.getenv("SESSION_MAX_HISTORY", "20"))
+
+# token budget of the conversation history sent with every /gpt and /talk request
+GPT_MAX_TOKENS = int(os.getenv("GPT_MAX_TOKENS", "3000"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+CONTEXT_SUMMARIZE = os.getenv("CONTEXT_SUMMARIZE", "true").lower() == "true"
+
+# file with Telegram file_ids of already uploaded images
+MEDIA_CACHE_PATH = os.getenv("MEDIA_CACHE_PATH", "media_cache.json")
+
+# reload prompts and messages from disk when they change
+RESOURCES_HOT_RELOAD = os.getenv("RESOURCES_HOT_RELOAD", "false").lower() == "true"
+RESOURCES_RELOAD_INTERVAL = float(os.getenv("RESOURCES_RELOAD_INTERVAL", "5"))
+
+# how updates are received: "polling" or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# number of chats processed at the same time; updates of one chat are always processed in order
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "64"))
+# updates of one chat that may wait while the previous one is processed
+CHAT_QUEUE_DEPTH = int(os.getenv("CHAT_QUEUE_DEPTH", "10"))
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+# public URL Telegram sends updates to, e.g. https://example.com/telegram; required in webhook mode,
+# except with WORKERS > 1, where the webhook is only registered if it is set
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+
+# number of pre-generated random facts kept ready for /random (0 disables the pool)
+FACT_POOL_SIZE = int(os.getenv("FACT_POOL_SIZE", "20"))
+FACT_POOL_MAX_PARALLEL = int(os.getenv("FACT_POOL_MAX_PARALLEL", "4"))
+
+# cache of ChatGPT answers: backend is "memory" or "sqlite", modes are a comma separated
+# list of "gpt", "talk" (first question of a conversation) and "random"
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.sqlite3")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+RESPONSE_CACHE_MODES = os.getenv("RESPONSE_CACHE_MODES", "gpt,talk")
+
+# stream /gpt and /talk answers by editing a single message while they are generated
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+
+# outgoing Bot API requests per second: in total, per private chat and per group
+RATE_LIMIT_GLOBAL = float(os.getenv("RATE_LIMIT_GLOBAL", "30"))
+RATE_LIMIT_PER_CHAT = float(os.getenv("RATE_LIMIT_PER_CHAT", "1"))
+RATE_LIMIT_PER_GROUP = float(os.getenv("RATE_LIMIT_PER_GROUP", "0.33"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "3"))
+
+# connection to the OpenAI API
+OPENAI_PROXY = os.getenv("OPENAI_PROXY", "")
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "true").lower() == "true"
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))
+OPENAI_KEEPALIVE = int(os.getenv("OPENAI_KEEPALIVE", "20"))
+# retries of connection errors, timeouts, 429 and 5xx responses with jittered exponential backoff
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+# consecutive upstream failures that open the circuit breaker, and seconds until a retry
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+
+# storage of user_data and chat_data: "" (memory only), "sqlite", "redis" or "memory" (local Redis stand-in)
+PERSISTENCE_BACKEND = os.getenv("PERSISTENCE_BACKEND", "")
+PERSISTENCE_PATH = os.getenv("PERSISTENCE_PATH", "bot_state.sqlite3")
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL", "5"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Bot API and OpenAI endpoints, can point to local stand-in servers for load tests
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org/bot")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")
+# number of worker processes; with more than one, updates are sharded by chat id
+WORKERS = int(os.getenv("WORKERS", "1"))
+
+# Prometheus metrics endpoint (port 0 disables it) and span traces in the log
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9000"))
+TRACING = os.getenv("TRACING", "false").lower() == "true"
+
+# per-user limits of the ChatGPT modes as "mode:value" lists: requests per QUOTA_WINDOW seconds
+# and tokens per day (UTC); modes that are not listed are unlimited
+QUOTA_REQUESTS = os.getenv("QUOTA_REQUESTS", "gpt:10,talk:10,random:20")
+QUOTA_WINDOW = float(os.getenv("QUOTA_WINDOW", "60"))
+QUOTA_DAILY_TOKENS = os.getenv("QUOTA_DAILY_TOKENS", "gpt:50000,talk:50000,random:20000")
+
+# modes whose identical concurrent stateless requests share one ChatGPT call
+SINGLE_FLIGHT_MODES = os.getenv("SINGLE_FLIGHT_MODES", "gpt,talk,random")
+
+# send quiz questions as one captioned photo instead of a photo and a message
+QUIZ_SINGLE_MESSAGE = os.getenv("QUIZ_SINGLE_MESSAGE", "true").lower() == "true"
+
+# word list of the /english game (one word per line, defaults to resources/words/english.txt)
+# and its difficulty: "easy", "medium", "hard" or "" for all words
+WORDS_PATH = os.getenv("WORDS_PATH", "")
+ENGLISH_DIFFICULTY = os.getenv("ENGLISH_DIFFICULTY", "")
+
+# also route free-text messages with keywords misspelled by one letter; off by default,
+# as real words one letter away from a keyword ("walking", "faces") are routed too
+INTENT_FUZZY = os.getenv("INTENT_FUZZY", "false").lower() == "true"
+
+# how users see that an answer is being prepared: "typing" (chat status refreshed every
+# TYPING_INTERVAL seconds) or "placeholder" (a message that is deleted when the answer is sent)
+WAITING_INDICATOR = os.getenv("WAITING_INDICATOR", "typing")
+TYPING_INTERVAL = float(os.getenv("TYPING_INTERVAL", "4"))
@@ -1 +1,9 @@
-CLOSE_BUTTON = {"start": "Close"}
+from src.callbacks import encode, MODE_MENU, ACTION_CLOSE
+
+CLOSE_BUTTON = {encode(MODE_MENU, ACTION_CLOSE): "Close"}
+
+UPSTREAM_UNAVAILABLE_TEXT = "ChatGPT is temporarily unavailable. Please try again in a minute."
+
+QUOTA_EXCEEDED_TEXT = "You have reached the limit for this mode. Please try again in {wait}."
+
+EMPTY_ANSWER_TEXT = "ChatGPT returned an empty answer. Please try again."
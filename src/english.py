@@ -3,8 +3,14 @@ import random
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 
-from src.en_words import EN_WORDS
+from src.callbacks import encode, MODE_ENGLISH, ACTION_NEXT
+from src.config import ENGLISH_DIFFICULTY
+from src.constants import CLOSE_BUTTON
 from src.utils import send_image
+from src.word_bank import word_bank, TIERS
+
+if ENGLISH_DIFFICULTY and ENGLISH_DIFFICULTY not in TIERS:
+    raise ValueError(f"ENGLISH_DIFFICULTY must be one of {', '.join(TIERS)} or empty, not {ENGLISH_DIFFICULTY!r}")
 
 
 def scramble(word: str) -> str:
@@ -29,7 +35,10 @@ async def english(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
     context.user_data["conversation_state"] = "english"
     await send_image(update, context, "english")
-    word = random.choice(EN_WORDS)
+    # the shuffle bag lives in chat_data, which survives the user_data resets of the game rounds
+    word, context.chat_data["english_bag"] = word_bank.draw(
+        context.chat_data.get("english_bag"), ENGLISH_DIFFICULTY or None
+    )
 
     context.user_data["english_word"] = word
     context.user_data["english_scrambled"] = scramble(word)
@@ -43,8 +52,8 @@ async def english(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     keyboard = [
         [
-            InlineKeyboardButton("Next", callback_data="eng_next"),
-            InlineKeyboardButton("Close", callback_data="start"),
+            InlineKeyboardButton("Next", callback_data=encode(MODE_ENGLISH, ACTION_NEXT)),
+            *(InlineKeyboardButton(text, callback_data=data) for data, text in CLOSE_BUTTON.items()),
         ],
     ]
 
@@ -55,18 +64,13 @@ async def english(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
-async def english_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def english_button(update: Update, context: ContextTypes.DEFAULT_TYPE, index: int):
     """
-    Handle inline keyboard actions for the English word scramble game.
-    Behavior:
-    - Ignores callbacks if the current conversation state is not "english".
-    - On "eng_next", starts a new English game round.
+    Handle the "Next" button of the English word scramble game.
+    Ignores callbacks if the current conversation state is not "english",
+    otherwise starts a new English game round.
     """
-    query = update.callback_query
-    await query.answer()
-
     if context.user_data.get("conversation_state") != "english":
         return
 
-    if query.data == "eng_next":
-        await english(update, context)
+    await english(update, context)
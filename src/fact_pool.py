@@ -0,0 +1,111 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from collections import deque
+
+from src.config import FACT_POOL_SIZE, FACT_POOL_MAX_PARALLEL
+from src.gpt import chatgpt_service, ChatGPTService
+from src.utils import load_prompt
+
+logger = logging.getLogger(__name__)
+
+FACT_QUESTION = "Tell me a random fact"
+# how many recent facts are remembered to drop duplicates
+SEEN_FACTS_LIMIT = 1000
+MAX_BACKOFF = 60
+
+
+class FactPool:
+    """
+    Pool of pre-generated random facts.
+    `run` keeps up to `size` deduplicated facts ready in a queue, so `/random`
+    can answer without waiting for a completion. The number of parallel
+    refill requests follows the consumption rate. Upstream errors and rounds
+    that bring only duplicate facts make the refill back off exponentially, so a
+    model that keeps repeating itself is not asked again and again.
+    """
+
+    def __init__(self, service: ChatGPTService, size: int, max_parallel: int):
+        self.service = service
+        self.size = size
+        self.max_parallel = max_parallel
+        self.facts = deque()
+        self._seen = deque(maxlen=SEEN_FACTS_LIMIT)
+        self._seen_set = set()
+        self._wakeup = asyncio.Event()
+        # exponentially weighted consumption rate (facts per second) and generation time
+        self._rate = 0.0
+        self._last_pop = None
+        self._generation_time = 3.0
+        self._backoff = 0.0
+
+    def pop(self) -> str | None:
+        """Take a ready fact or return None if the pool is empty."""
+        now = time.monotonic()
+        if self._last_pop is not None:
+            interval = max(now - self._last_pop, 0.001)
+            self._rate = 0.8 * self._rate + 0.2 / interval
+        self._last_pop = now
+        self._wakeup.set()
+        return self.facts.popleft() if self.facts else None
+
+    async def generate(self, coalesce: bool = True) -> str:
+        """
+        Request a new fact from ChatGPT.
+        With `coalesce`, concurrent callers share one fact and may get a cached
+        one; refills of the pool need distinct facts and bypass both.
+        """
+        started = time.monotonic()
+        fact = await self.service.send_question(
+            prompt_text=load_prompt("random"),
+            message_text=FACT_QUESTION,
+            mode="random",
+            coalesce=coalesce,
+            use_cache=coalesce
+        )
+        self._generation_time = 0.8 * self._generation_time + 0.2 * (time.monotonic() - started)
+        return fact
+
+    async def run(self) -> None:
+        """Background loop that keeps the pool topped up."""
+        while True:
+            missing = self.size - len(self.facts)
+            if missing <= 0:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            # enough parallel requests to cover consumption during one generation
+            parallel = math.ceil(self._rate * self._generation_time)
+            parallel = max(1, min(parallel, self.max_parallel, missing))
+            results = await asyncio.gather(
+                *(self.generate(coalesce=False) for _ in range(parallel)), return_exceptions=True
+            )
+            errors = [result for result in results if isinstance(result, BaseException)]
+            added = sum(self._add(fact) for fact in results if isinstance(fact, str))
+            if errors or not added:
+                self._backoff = min(max(self._backoff * 2, 1.0), MAX_BACKOFF)
+                if errors:
+                    logger.error(f"An error occurred while refilling the fact pool: {errors[0]}")
+                else:
+                    logger.warning("The fact pool refill brought only duplicate facts")
+                await asyncio.sleep(self._backoff)
+            else:
+                self._backoff = 0.0
+
+    def _add(self, fact: str) -> bool:
+        """Add a fact to the pool, return False if it is a duplicate."""
+        key = hashlib.sha1(" ".join(fact.lower().split()).encode("utf-8")).digest()
+        if key in self._seen_set:
+            return False
+        if len(self._seen) == self._seen.maxlen:
+            self._seen_set.discard(self._seen[0])
+        self._seen.append(key)
+        self._seen_set.add(key)
+        if len(self.facts) < self.size:
+            self.facts.append(fact)
+        return True
+
+
+fact_pool = FactPool(chatgpt_service, FACT_POOL_SIZE, FACT_POOL_MAX_PARALLEL)
@@ -1,49 +1,261 @@
-from openai import OpenAI
-import httpx
+import asyncio
+import logging
+from contextlib import nullcontext
+
+from openai import AsyncOpenAI, APIStatusError
 from telegram import Update
 from telegram.ext import ContextTypes
 
-from src.config import CHATGPT_TOKEN
+from src.config import (CHATGPT_TOKEN, GPT_MAX_CONCURRENCY, GPT_MAX_TOKENS, SESSION_MAX_CHATS, SESSION_TTL,
+                        SESSION_MAX_HISTORY, CONTEXT_TOKEN_BUDGET, CONTEXT_SUMMARIZE, OPENAI_MAX_RETRIES,
+                        OPENAI_BASE_URL, SINGLE_FLIGHT_MODES)
 from src.constants import CLOSE_BUTTON
+from src.metrics import LLM_SECONDS, LLM_ERRORS, LLM_TOKENS, span
+from src.quotas import record_tokens
+from src.response_cache import ResponseCache, create_response_cache, make_key
+from src.sessions import SessionStore, ChatSession
+from src.single_flight import SingleFlight
+from src.tokens import count_tokens
+from src.transport import CircuitBreaker, UPSTREAM_ERRORS, create_http_client
+
+from src.utils import send_image_text, load_prompt
 
-from src.utils import send_image, load_prompt, send_text_buttons
+logger = logging.getLogger(__name__)
+
+SUMMARY_MAX_TOKENS = 300
 
 
 class ChatGPTService:
-    client: OpenAI = None
-    message_list: list = None
+    """
+    Asynchronous ChatGPT client.
+    Completions are awaited on the event loop, so a slow answer never blocks
+    other chats. `max_concurrency` caps how many requests are in flight at once.
+    Every chat has its own conversation session in `sessions`; history above
+    `CONTEXT_TOKEN_BUDGET` is trimmed and, if enabled, folded into a summary.
+    Stateless requests of the modes enabled in `cache` are answered from it.
+    Requests fail fast with `UpstreamUnavailableError` while `breaker` is open.
+    Identical concurrent stateless requests of the modes in `single_flight_modes`
+    share one upstream call.
+    """
+    client: AsyncOpenAI = None
+    sessions: SessionStore = None
+    cache: ResponseCache = None
+    breaker: CircuitBreaker = None
+    flights: SingleFlight = None
+    single_flight_modes: set = None
+    semaphore: asyncio.Semaphore = None
+    background_tasks: set = None
 
-    def __init__(self, token):
-        self.client = OpenAI(
-            http_client=httpx.Client(proxy="http://18.199.183.77:49232"),
-            api_key=token
-        )
-        self.message_list = []
-
-    async def send_message_list(self) -> str:
-        completion = self.client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=self.message_list,
-            max_tokens=3000,
-            temperature=0.9
+    def __init__(self, token, max_concurrency: int = GPT_MAX_CONCURRENCY):
+        self.client = AsyncOpenAI(
+            http_client=create_http_client(max_concurrency),
+            api_key=token,
+            base_url=OPENAI_BASE_URL or None,
+            max_retries=OPENAI_MAX_RETRIES
         )
-        message = completion.choices[0].message
-        self.message_list.append(message)
-        return message.content
+        self.sessions = SessionStore(SESSION_MAX_CHATS, SESSION_TTL, SESSION_MAX_HISTORY)
+        self.cache = create_response_cache()
+        self.breaker = CircuitBreaker()
+        self.flights = SingleFlight()
+        self.single_flight_modes = {mode.strip() for mode in SINGLE_FLIGHT_MODES.split(",") if mode.strip()}
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.background_tasks = set()
+
+    async def send_message_list(self, message_list: list, max_tokens: int = GPT_MAX_TOKENS) -> str:
+        self.breaker.check()
+        try:
+            async with self.semaphore:
+                with LLM_SECONDS.time(kind="completion"), span("llm.completion"):
+                    completion = await self.client.chat.completions.create(
+                        model="gpt-3.5-turbo",
+                        messages=message_list,
+                        max_tokens=max_tokens,
+                        temperature=0.9
+                    )
+        except BaseException as e:
+            self.record_error(e)
+            raise
+        self.breaker.record_success()
+        self.record_usage(completion.usage)
+        return completion.choices[0].message.content
+
+    def set_prompt(self, chat_id: int, prompt_text: str) -> None:
+        self.sessions.reset(chat_id, prompt_text)
+
+    def ensure_prompt(self, chat_id: int, prompt_text: str) -> None:
+        """Start a new session only if the chat has none or it uses another prompt."""
+        session = self.sessions.get(chat_id)
+        if session is None or session.prompt != prompt_text:
+            self.sessions.reset(chat_id, prompt_text)
+
+    def end_session(self, chat_id: int) -> None:
+        self.sessions.drop(chat_id)
+
+    async def add_message(self, chat_id: int, message_text: str, mode: str | None = None) -> str:
+        session = self.sessions.get(chat_id)
+        if session is None:
+            raise LookupError(f"No conversation session for chat {chat_id}")
+        if not session.history and not session.summary:
+            # the first question of a conversation does not depend on any history
+            answer = await self.send_question(session.prompt, message_text, mode=mode)
+        else:
+            message_list = session.messages()
+            message_list.append({"role": "user", "content": message_text})
+            answer = await self.send_message_list(message_list)
+        self.remember(session, message_text, answer)
+        return answer
+
+    async def stream_message_list(self, message_list: list, max_tokens: int = GPT_MAX_TOKENS):
+        """Request a completion as a stream and yield its text deltas."""
+        self.breaker.check()
+        usage = None
+        parts = []
+        try:
+            async with self.semaphore:
+                with LLM_SECONDS.time(kind="stream"), span("llm.stream"):
+                    stream = await self.client.chat.completions.create(
+                        model="gpt-3.5-turbo",
+                        messages=message_list,
+                        max_tokens=max_tokens,
+                        temperature=0.9,
+                        stream=True,
+                        stream_options={"include_usage": True}
+                    )
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            parts.append(chunk.choices[0].delta.content)
+                            yield chunk.choices[0].delta.content
+                        if chunk.usage:
+                            usage = chunk.usage
+        except BaseException as e:
+            # also GeneratorExit when the consumer stops reading early
+            self.record_error(e)
+            raise
+        self.breaker.record_success()
+        if usage is not None:
+            self.record_usage(usage)
+        else:
+            # servers that ignore stream_options report no usage, so it is estimated
+            record_tokens(sum(count_tokens(message["content"]) for message in message_list)
+                          + count_tokens("".join(parts)))
+
+    def record_error(self, error: BaseException) -> None:
+        """Tell the circuit breaker how a request failed."""
+        if isinstance(error, UPSTREAM_ERRORS):
+            LLM_ERRORS.inc(error=type(error).__name__)
+            self.breaker.record_failure()
+        elif isinstance(error, APIStatusError):
+            # the upstream answered, the request itself was rejected
+            LLM_ERRORS.inc(error=type(error).__name__)
+            self.breaker.record_success()
+        else:
+            # cancelled or abandoned, nothing is known about the upstream
+            self.breaker.release_trial()
+
+    @staticmethod
+    def record_usage(usage) -> None:
+        if usage is not None:
+            LLM_TOKENS.inc(usage.prompt_tokens, type="prompt")
+            LLM_TOKENS.inc(usage.completion_tokens, type="completion")
+            record_tokens(usage.total_tokens)
+
+    async def stream_message(self, chat_id: int, message_text: str, mode: str | None = None):
+        """Streaming version of `add_message`: yields the answer in parts as it is generated."""
+        session = self.sessions.get(chat_id)
+        if session is None:
+            raise LookupError(f"No conversation session for chat {chat_id}")
+        first_turn = not session.history and not session.summary
+        cacheable = first_turn and self.cache.is_cacheable(mode)
+        if cacheable:
+            answer = await self.cache.get(mode, session.prompt, message_text)
+            if answer is not None:
+                yield answer
+                self.remember(session, message_text, answer)
+                return
+        flight_key = None
+        if first_turn and mode in self.single_flight_modes:
+            flight_key = make_key(session.prompt, message_text)
+            answer = await self.flights.follow(flight_key, mode)
+            if answer is not None:
+                yield answer
+                self.remember(session, message_text, answer)
+                return
+        message_list = session.messages()
+        message_list.append({"role": "user", "content": message_text})
+        parts = []
+        with self.flights.lead(flight_key) if flight_key else nullcontext() as flight:
+            async for delta in self.stream_message_list(message_list):
+                parts.append(delta)
+                yield delta
+            answer = "".join(parts)
+            if flight is not None:
+                flight.set_result(answer)
+        if cacheable:
+            await self.cache.set(session.prompt, message_text, answer)
+        self.remember(session, message_text, answer)
 
-    def set_prompt(self, prompt_text: str) -> None:
-        self.message_list.clear()
-        self.message_list.append({"role": "system", "content": prompt_text})
+    def remember(self, session: ChatSession, message_text: str, answer: str) -> None:
+        """Add a question and its answer to the session and keep it within the token budget."""
+        session.add("user", message_text)
+        session.add("assistant", answer)
+        dropped = session.trim(CONTEXT_TOKEN_BUDGET)
+        if dropped and CONTEXT_SUMMARIZE:
+            session.unsummarized.extend(dropped)
+            # one summary task per session, turns trimmed meanwhile are folded in by its next round
+            if not session.summarizing:
+                session.summarizing = True
+                task = asyncio.create_task(self.update_summary(session))
+                self.background_tasks.add(task)
+                task.add_done_callback(self.background_tasks.discard)
 
-    async def add_message(self, message_text: str) -> str:
-        self.message_list.append({"role": "user", "content": message_text})
-        return await self.send_message_list()
+    async def update_summary(self, session: ChatSession) -> None:
+        """Fold the trimmed turns into the rolling summary of the session until none are left."""
+        try:
+            while session.unsummarized:
+                dropped, session.unsummarized = session.unsummarized, []
+                history = "\n".join(f"{role}: {content}" for role, content in dropped)
+                message_text = f"Current summary: {session.summary or 'none'}\n\nMessages:\n{history}"
+                try:
+                    summary = await self.send_question(load_prompt("summary"), message_text, SUMMARY_MAX_TOKENS)
+                except Exception as e:
+                    logger.error(f"An error occurred while summarizing the conversation: {e}")
+                    # the turns are summarized with the next ones
+                    session.unsummarized[:0] = dropped
+                    return
+                session.set_summary(summary)
+        finally:
+            session.summarizing = False
 
-    async def send_question(self, prompt_text: str, message_text: str) -> str:
-        self.message_list.clear()
-        self.message_list.append({"role": "system", "content": prompt_text})
-        self.message_list.append({"role": "user", "content": message_text})
-        return await self.send_message_list()
+    async def send_question(self, prompt_text: str, message_text: str, max_tokens: int = GPT_MAX_TOKENS,
+                            mode: str | None = None, coalesce: bool = True, use_cache: bool = True) -> str:
+        """
+        Ask a question without conversation history.
+        With `coalesce`, a request of a single-flight mode joins an identical one in flight.
+        Without `use_cache`, the response cache is neither read nor written, for
+        callers that need a fresh answer every time.
+        """
+        cacheable = use_cache and self.cache.is_cacheable(mode)
+        if cacheable:
+            answer = await self.cache.get(mode, prompt_text, message_text)
+            if answer is not None:
+                return answer
+        message_list = [
+            {"role": "system", "content": prompt_text},
+            {"role": "user", "content": message_text}
+        ]
+        if coalesce and mode in self.single_flight_modes:
+            key = make_key(prompt_text, message_text)
+            answer = await self.flights.follow(key, mode)
+            if answer is not None:
+                return answer
+            with self.flights.lead(key) as flight:
+                answer = await self.send_message_list(message_list, max_tokens)
+                flight.set_result(answer)
+        else:
+            answer = await self.send_message_list(message_list, max_tokens)
+        if cacheable:
+            await self.cache.set(prompt_text, message_text, answer)
+        return answer
 
 
 chatgpt_service = ChatGPTService(CHATGPT_TOKEN)
@@ -52,11 +264,11 @@ chatgpt_service = ChatGPTService(CHATGPT_TOKEN)
 # handler for /gpt button
 async def gpt(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
-    await send_image(update, context, "gpt")
-    chatgpt_service.set_prompt(load_prompt("gpt"))
-    await send_text_buttons(
+    chatgpt_service.set_prompt(update.effective_chat.id, load_prompt("gpt"))
+    await send_image_text(
         update,
         context,
+        "gpt",
         "Ask me a question ...",
         CLOSE_BUTTON
     )
@@ -2,13 +2,23 @@ import logging
 from random import choice
 
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
 
-from src.constants import CLOSE_BUTTON
+from src.config import STREAM_RESPONSES, WAITING_INDICATOR
+from src.callbacks import encode, MODE_RANDOM, MODE_ENGLISH, ACTION_NEXT
+from src.constants import CLOSE_BUTTON, UPSTREAM_UNAVAILABLE_TEXT, QUOTA_EXCEEDED_TEXT
 
+from src.fact_pool import fact_pool
 from src.gpt import chatgpt_service, gpt
+from src.intent_router import intent_router
+from src.metrics import PERSONALITIES
+from src.personalities import personalities
+from src.quotas import quotas
 from src.talk_data import talk
-from utils import (send_image, send_text, load_message, show_main_menu, load_prompt, send_text_buttons)
+from src.transport import UpstreamUnavailableError
+from utils import (send_image, send_text, load_message, show_main_menu, load_prompt, send_text_buttons,
+                   send_text_stream, send_image_text, edit_caption, send_batch, waiting)
 
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -17,137 +27,186 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-async def close_button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+def format_wait(seconds: float) -> str:
+    if seconds >= 3600:
+        return f"{round(seconds / 3600)} h"
+    if seconds >= 60:
+        return f"{round(seconds / 60)} min"
+    return f"{max(round(seconds), 1)} s"
+
+
+async def check_quota(update: Update, context: ContextTypes.DEFAULT_TYPE, mode: str) -> bool:
+    """
+    Count a ChatGPT request of the user against their quota.
+    Over the limit, the user is told when to try again without calling ChatGPT.
+    """
+    wait = quotas.acquire(update.effective_user.id, mode)
+    if wait:
+        await send_text(update, context, QUOTA_EXCEEDED_TEXT.format(wait=format_wait(wait)))
+        return False
+    return True
+
+
+async def close_button(update: Update, context: ContextTypes.DEFAULT_TYPE, index: int) -> None:
     """
         close_button is needed to exit the current mode and return the user to the main menu.
     """
-    query = update.callback_query
-    await query.answer()
     context.user_data.clear()
+    chatgpt_service.end_session(update.effective_chat.id)
     await start(update, context)
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await send_image(update, context, "start")
-    await send_text(update, context, load_message("start"))
-    await show_main_menu(
-        update,
-        context,
-        {
-            "start": "Main menu",
-            "random": "Get a random fact",
-            "gpt": "Ask ChatGPT",
-            "talk": "Talk with a famous person",
-            "quiz": "Test your knowledge",
-            "english": "Unscramble the word"
-        }
+    await send_batch(
+        send_image_text(update, context, "start", load_message("start"), parse_mode=ParseMode.MARKDOWN),
+        show_main_menu(
+            update,
+            context,
+            {
+                "start": "Main menu",
+                "random": "Get a random fact",
+                "gpt": "Ask ChatGPT",
+                "talk": "Talk with a famous person",
+                "quiz": "Test your knowledge",
+                "english": "Unscramble the word"
+            }
+        )
     )
 
 
 async def random(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await send_image(update, context, "random")
-    message_to_delete = await send_text(update, context, "Looking for a random fact...")
+    if not await check_quota(update, context, "random"):
+        return
+    buttons = {
+        encode(MODE_RANDOM, ACTION_NEXT): "Want another fact",
+        **CLOSE_BUTTON
+    }
+    fact = fact_pool.pop()
+    if fact is not None:
+        await send_image_text(update, context, "random", fact, buttons)
+        return
+    if WAITING_INDICATOR != "placeholder":
+        try:
+            async with waiting(update, context):
+                with quotas.track(update.effective_user.id, "random"):
+                    fact = await fact_pool.generate()
+                await send_image_text(update, context, "random", fact, buttons)
+        except UpstreamUnavailableError:
+            await send_text(update, context, UPSTREAM_UNAVAILABLE_TEXT)
+        except Exception as e:
+            logger.error(f"An error occurred in the handler /random: {e}")
+            await send_text(update, context, "An error occurred while getting a random fact.")
+        return
+    # the photo goes out with a placeholder caption that is replaced by the fact
+    message = await send_image(update, context, "random", caption="Looking for a random fact...")
     try:
-        prompt = load_prompt("random")
-        fact = await chatgpt_service.send_question(
-            prompt_text=prompt,
-            message_text="Tell me a random fact"
-        )
-        buttons = {
-            "random": "Want another fact",
-            **CLOSE_BUTTON
-        }
-        await send_text_buttons(update, context, fact, buttons)
+        with quotas.track(update.effective_user.id, "random"):
+            fact = await fact_pool.generate()
+        await edit_caption(update, context, message, fact, buttons)
+    except UpstreamUnavailableError:
+        await edit_caption(update, context, message, UPSTREAM_UNAVAILABLE_TEXT)
     except Exception as e:
         logger.error(f"An error occurred in the handler /random: {e}")
-        await send_text(update, context, "An error occurred while getting a random fact.")
-    finally:
-        await context.bot.delete_message(
-            chat_id=update.effective_chat.id,
-            message_id=message_to_delete.message_id
-        )
+        await edit_caption(update, context, message, "An error occurred while getting a random fact.")
+
 
+async def random_button(update: Update, context: ContextTypes.DEFAULT_TYPE, index: int) -> None:
+    await random(update, context)
 
-async def random_button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    query = update.callback_query
-    await query.answer()
-    data = query.data
-    if data == 'random':
-        await random(update, context)
-    elif data == 'start':
-        await start(update, context)
-
-
-async def talk_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    data = query.data
-    if data == "start":
-        context.user_data.pop("conversation_state", None)
-        context.user_data.pop("selected_personality", None)
-        await start(update, context)
+
+async def talk_button(update: Update, context: ContextTypes.DEFAULT_TYPE, index: int):
+    personality = personalities.by_id(index)
+    if personality is None:
         return
-    if data.startswith("talk_"):
-        context.user_data.clear()
-        context.user_data["selected_personality"] = data
-        context.user_data["conversation_state"] = "talk"
-        prompt = load_prompt(data)
-        chatgpt_service.set_prompt(prompt)
-        personality_name = data.replace("talk_", "").replace("_", " ").title()
-        await send_image(update, context, data)
-        buttons = {**CLOSE_BUTTON}
-        await send_text_buttons(
-            update,
-            context,
-            f"Hello, I`m {personality_name}."
-            f"\nI heard you wanted to ask me something. "
-            f"\nYou can ask questions in your native language.",
-            buttons
-        )
+    context.user_data.clear()
+    context.user_data["selected_personality"] = personality.key
+    context.user_data["conversation_state"] = "talk"
+    PERSONALITIES.inc(personality=personality.key)
+    prompt = load_prompt(personality.key)
+    chatgpt_service.set_prompt(update.effective_chat.id, prompt)
+    buttons = {**CLOSE_BUTTON}
+    await send_image_text(
+        update,
+        context,
+        personality.key,
+        f"Hello, I`m {personality.name}."
+        f"\nI heard you wanted to ask me something. "
+        f"\nYou can ask questions in your native language.",
+        buttons
+    )
 
 
 async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message_text = update.message.text
     conversation_state = context.user_data.get("conversation_state")
+    if conversation_state in ("gpt", "talk") and not await check_quota(update, context, conversation_state):
+        return
     if conversation_state == "gpt":
-        waiting_message = await send_text(update, context, "...")
+        chatgpt_service.ensure_prompt(update.effective_chat.id, load_prompt("gpt"))
+        if STREAM_RESPONSES:
+            try:
+                with quotas.track(update.effective_user.id, "gpt"):
+                    await send_text_stream(
+                        update,
+                        context,
+                        chatgpt_service.stream_message(update.effective_chat.id, message_text, mode="gpt"),
+                        CLOSE_BUTTON
+                    )
+            except UpstreamUnavailableError:
+                await send_text(update, context, UPSTREAM_UNAVAILABLE_TEXT)
+            except Exception as e:
+                logger.error(f"An error occurred while receiving a response from ChatGPT: {e}")
+                await send_text(update, context, "An error occurred while processing your message.")
+            return
         try:
-            response = await chatgpt_service.add_message(message_text)
-            buttons = {
-                **CLOSE_BUTTON
-            }
-            await send_text_buttons(update, context, response, buttons)
+            async with waiting(update, context):
+                with quotas.track(update.effective_user.id, "gpt"):
+                    response = await chatgpt_service.add_message(update.effective_chat.id, message_text, mode="gpt")
+                buttons = {
+                    **CLOSE_BUTTON
+                }
+                await send_text_buttons(update, context, response, buttons)
+        except UpstreamUnavailableError:
+            await send_text(update, context, UPSTREAM_UNAVAILABLE_TEXT)
         except Exception as e:
             logger.error(f"An error occurred while receiving a response from ChatGPT: {e}")
             await send_text(update, context, "An error occurred while processing your message.")
-        finally:
-            await context.bot.delete_message(
-                chat_id=update.effective_chat.id,
-                message_id=waiting_message.message_id
-            )
     elif conversation_state == "talk":
-        personality = context.user_data.get("selected_personality")
+        personality = personalities.get(context.user_data.get("selected_personality"))
         if personality:
-            prompt = load_prompt(personality)
-            chatgpt_service.set_prompt(prompt)
+            prompt = load_prompt(personality.key)
+            chatgpt_service.ensure_prompt(update.effective_chat.id, prompt)
         else:
             await send_text(update, context, "Please choose a personality to start the conversation!")
             return
-        waiting_message = await send_text(update, context, "...")
+        personality_name = personality.name
+        if STREAM_RESPONSES:
+            try:
+                with quotas.track(update.effective_user.id, "talk"):
+                    await send_text_stream(
+                        update,
+                        context,
+                        chatgpt_service.stream_message(update.effective_chat.id, message_text, mode="talk"),
+                        CLOSE_BUTTON,
+                        prefix=f"{personality_name}: "
+                    )
+            except UpstreamUnavailableError:
+                await send_text(update, context, UPSTREAM_UNAVAILABLE_TEXT)
+            except Exception as e:
+                logger.error(f"An error occurred while receiving a response from ChatGPT: {e}")
+                await send_text(update, context, "An error occurred while processing your message.")
+            return
         try:
-            response = await chatgpt_service.add_message(message_text)
-            buttons = {**CLOSE_BUTTON}
-            personality_name = personality.replace("talk_", "").replace("_", " ").title()
-            await send_text_buttons(update, context, f"{personality_name}: {response}", buttons)
+            async with waiting(update, context):
+                with quotas.track(update.effective_user.id, "talk"):
+                    response = await chatgpt_service.add_message(update.effective_chat.id, message_text, mode="talk")
+                buttons = {**CLOSE_BUTTON}
+                await send_text_buttons(update, context, f"{personality_name}: {response}", buttons)
+        except UpstreamUnavailableError:
+            await send_text(update, context, UPSTREAM_UNAVAILABLE_TEXT)
         except Exception as e:
             logger.error(f"An error occurred while receiving a response from ChatGPT: {e}")
             await send_text(update, context, "An error occurred while processing your message.")
-            await context.bot.delete_message(chat_id=update.effective_chat.id, message_id=waiting_message.message_id)
-        finally:
-            await context.bot.delete_message(
-                chat_id=update.effective_chat.id,
-                message_id=waiting_message.message_id
-            )
     elif conversation_state == "english":
         """
         Handle user input for the English word game.
@@ -160,8 +219,8 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         keyboard = InlineKeyboardMarkup([
             [
-                InlineKeyboardButton("Next", callback_data="eng_next"),
-                InlineKeyboardButton("Close", callback_data="start"),
+                InlineKeyboardButton("Next", callback_data=encode(MODE_ENGLISH, ACTION_NEXT)),
+                *(InlineKeyboardButton(text, callback_data=data) for data, text in CLOSE_BUTTON.items()),
             ]
         ])
 
@@ -185,34 +244,20 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def inter_random_input(update: Update, context: ContextTypes.DEFAULT_TYPE, message_text):
-    message_text_lower = message_text.lower()
-    if any(keyword in message_text_lower for keyword in ["fact", "interesting", "random"]):
-        await send_text(
-            update,
-            context,
-            text="It looks like you’re interested in random facts! I’ll show you one now..."
-        )
-        await random(update, context)
-        return True
+    intent = intent_router.match(message_text)
+    if intent is None:
+        return False
+    await send_text(update, context, text=intent.reply)
+    await INTENT_HANDLERS[intent.name](update, context)
+    return True
 
-    elif any(keyword in message_text_lower for keyword in ["gpt", "chat", "question", "ask", "find out"]):
-        await send_text(
-            update,
-            context,
-            text="It looks like you have a question! Switching to ChatGPT conversation mode..."
-        )
-        await gpt(update, context)
-        return True
 
-    elif any(keyword in message_text_lower for keyword in ["conversation", "talk", "communicate", "personality"]):
-        await send_text(
-            update,
-            context,
-            text="It looks like you want to chat with a famous personality! Here are the available options..."
-        )
-        await talk(update, context)
-        return True
-    return False
+# handlers of the intents in resources/intents.json
+INTENT_HANDLERS = {
+    "random": random,
+    "gpt": gpt,
+    "talk": talk,
+}
 
 
 async def show_funny_response(update: Update, context: ContextTypes.DEFAULT_TYPE):
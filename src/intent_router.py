@@ -0,0 +1,117 @@
+import json
+import os
+import re
+
+from src.config import INTENT_FUZZY
+from src.resource_registry import RESOURCES_DIR
+
+WORD_RE = re.compile(r"\w+")
+
+# keywords shorter than this are only matched exactly
+FUZZY_MIN_LENGTH = 5
+
+
+def within_one_edit(first: str, second: str) -> bool:
+    """True if the words differ by at most one inserted, deleted, replaced or swapped letter."""
+    if abs(len(first) - len(second)) > 1:
+        return False
+    if len(first) > len(second):
+        first, second = second, first
+    prefix = 0
+    while prefix < len(first) and first[prefix] == second[prefix]:
+        prefix += 1
+    if len(first) == len(second):
+        swapped = (prefix + 1 < len(first) and first[prefix] == second[prefix + 1]
+                   and first[prefix + 1] == second[prefix] and first[prefix + 2:] == second[prefix + 2:])
+        return swapped or first[prefix + 1:] == second[prefix + 1:]
+    return first[prefix:] == second[prefix + 1:]
+
+
+def deletions(word: str) -> set[str]:
+    return {word[:index] + word[index + 1:] for index in range(len(word))}
+
+
+class Intent:
+    __slots__ = ("name", "priority", "reply")
+
+    def __init__(self, name: str, priority: int, reply: str):
+        self.name = name
+        self.priority = priority
+        self.reply = reply
+
+
+class IntentRouter:
+    """
+    Routes free-text messages to intents by their keywords.
+    Keywords are whole words or phrases, or word prefixes written as "word*".
+    All keywords of all intents are compiled into hash tables, and a message is
+    matched in a single pass over its words, so the cost does not depend on the
+    number of intents. Of several matched intents the one with the highest
+    priority wins. With `fuzzy`, keywords misspelled by one letter are matched
+    when nothing matches exactly.
+    """
+
+    def __init__(self, intents: list[dict], fuzzy: bool = INTENT_FUZZY):
+        self.fuzzy = fuzzy
+        self.phrases: dict[str, Intent] = {}
+        self.prefixes: dict[str, Intent] = {}
+        # deletion variants of single-word keywords -> keywords, for fuzzy matching
+        self.variants: dict[str, set[str]] = {}
+        self.max_phrase_words = 1
+        for item in intents:
+            intent = Intent(item["name"], item.get("priority", 0), item.get("reply", ""))
+            for keyword in item["keywords"]:
+                self._add(keyword, intent)
+        self.prefix_lengths = sorted({len(prefix) for prefix in self.prefixes})
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "IntentRouter":
+        with open(path, "r", encoding="utf-8") as file:
+            return cls(json.load(file), **kwargs)
+
+    def match(self, text: str) -> Intent | None:
+        words = WORD_RE.findall(text.lower())
+        best = None
+        for position, word in enumerate(words):
+            for count in range(1, min(self.max_phrase_words, len(words) - position) + 1):
+                phrase = word if count == 1 else " ".join(words[position:position + count])
+                best = self._better(best, self.phrases.get(phrase))
+            for length in self.prefix_lengths:
+                if length > len(word):
+                    break
+                best = self._better(best, self.prefixes.get(word[:length]))
+        if best is None and self.fuzzy:
+            for word in words:
+                best = self._better(best, self._fuzzy(word))
+        return best
+
+    def _add(self, keyword: str, intent: Intent) -> None:
+        keyword = " ".join(WORD_RE.findall(keyword.lower())) + ("*" if keyword.endswith("*") else "")
+        if keyword.endswith("*"):
+            self.prefixes[keyword[:-1]] = intent
+            return
+        self.phrases[keyword] = intent
+        words = keyword.count(" ") + 1
+        self.max_phrase_words = max(self.max_phrase_words, words)
+        if words == 1 and len(keyword) >= FUZZY_MIN_LENGTH:
+            for variant in deletions(keyword) | {keyword}:
+                self.variants.setdefault(variant, set()).add(keyword)
+
+    def _fuzzy(self, word: str) -> Intent | None:
+        if len(word) < FUZZY_MIN_LENGTH - 1:
+            return None
+        best = None
+        for variant in deletions(word) | {word}:
+            for keyword in self.variants.get(variant, ()):
+                if within_one_edit(word, keyword):
+                    best = self._better(best, self.phrases[keyword])
+        return best
+
+    @staticmethod
+    def _better(best: Intent | None, candidate: Intent | None) -> Intent | None:
+        if candidate is None or (best is not None and best.priority >= candidate.priority):
+            return best
+        return candidate
+
+
+intent_router = IntentRouter.from_file(os.path.join(RESOURCES_DIR, "intents.json"))
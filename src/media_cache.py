@@ -0,0 +1,105 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from src.config import MEDIA_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+
+class MediaCache:
+    """
+    Persistent cache of Telegram `file_id`s for local images.
+    Telegram returns a `file_id` after the first upload of a file; sending that id
+    instead of the file avoids uploading the same image again. Entries are keyed by
+    image path and store the content hash, so an image changed on disk is uploaded anew.
+    The cache is kept in a JSON file and survives restarts. Every write re-reads
+    the file and merges the changed entry into it under a file lock, so several
+    bot processes can share the file without erasing each other's entries.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # (mtime, size) -> hash per image, so unchanged files are not re-hashed on every send
+        self._stats = {}
+        self._entries = self._load()
+
+    def get(self, image_path: str) -> str | None:
+        entry = self._entries.get(self._key(image_path))
+        if entry is None or entry["hash"] != self._hash(image_path):
+            return None
+        return entry["file_id"]
+
+    def set(self, image_path: str, file_id: str) -> None:
+        key = self._key(image_path)
+        self._entries[key] = {"hash": self._hash(image_path), "file_id": file_id}
+        self._save(key, self._entries[key])
+
+    def invalidate(self, image_path: str) -> None:
+        key = self._key(image_path)
+        if self._entries.pop(key, None) is not None:
+            self._save(key, None)
+
+    @staticmethod
+    def _key(image_path: str) -> str:
+        return os.path.relpath(image_path, os.path.dirname(os.path.abspath(__file__)))
+
+    def _hash(self, image_path: str) -> str:
+        stat = os.stat(image_path)
+        cached = self._stats.get(image_path)
+        if cached and cached[0] == (stat.st_mtime_ns, stat.st_size):
+            return cached[1]
+        with open(image_path, "rb") as image:
+            digest = hashlib.sha256(image.read()).hexdigest()
+        self._stats[image_path] = ((stat.st_mtime_ns, stat.st_size), digest)
+        return digest
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    @contextmanager
+    def _locked(self):
+        """Hold an exclusive lock of the cache file between processes, where supported."""
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _save(self, key: str, entry: dict | None) -> None:
+        """Write one changed entry, or its removal for None, merged with the entries in the file."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            with self._locked():
+                entries = self._load()
+                if entry is None:
+                    entries.pop(key, None)
+                else:
+                    entries[key] = entry
+                fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as file:
+                    json.dump(entries, file, indent=2)
+                os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"An error occurred while saving the media cache: {e}")
+            return
+        # entries written by other processes are picked up as well
+        self._entries = entries
+
+media_cache = MediaCache(MEDIA_CACHE_PATH)
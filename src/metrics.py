@@ -0,0 +1,211 @@
+import asyncio
+import functools
+import itertools
+import json
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable
+
+from src.config import TRACING
+
+logger = logging.getLogger(__name__)
+trace_logger = logging.getLogger("trace")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_trace_id: ContextVar[int | None] = ContextVar("trace_id", default=None)
+_trace_ids = itertools.count(1)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels[name] for name in self.labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in self.values.items())
+        return lines
+
+
+class Gauge:
+    """Value read on every scrape from `read`, which returns a number or a dict of label values to numbers."""
+
+    def __init__(self, name: str, description: str, read: Callable, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.read = read
+        self.labels = labels
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge"]
+        values = self.read()
+        if not isinstance(values, dict):
+            values = {(): values}
+        lines.extend(f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in values.items())
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket (the last one is +Inf), sum]
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels[name] for name in self.labels)
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.labels, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name: str, description: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, description, labels))
+
+    def histogram(self, name: str, description: str, labels: tuple[str, ...] = ()) -> Histogram:
+        return self._add(Histogram(name, description, labels))
+
+    def gauge(self, name: str, description: str, read: Callable, labels: tuple[str, ...] = ()) -> Gauge:
+        return self._add(Gauge(name, description, read, labels))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+
+metrics = MetricsRegistry()
+
+HANDLER_SECONDS = metrics.histogram("bot_handler_seconds", "Time spent in update handlers", ("handler",))
+HANDLER_ERRORS = metrics.counter("bot_handler_errors_total", "Exceptions raised by update handlers", ("handler",))
+COMMANDS = metrics.counter("bot_commands_total", "Received commands", ("command",))
+PERSONALITIES = metrics.counter("bot_talk_personality_total", "Chosen /talk personalities", ("personality",))
+TELEGRAM_SECONDS = metrics.histogram("telegram_request_seconds", "Duration of Bot API requests", ("endpoint",))
+TELEGRAM_WAIT_SECONDS = metrics.histogram(
+    "telegram_request_wait_seconds", "Time Bot API requests wait for the rate limiter", ("endpoint",)
+)
+LLM_SECONDS = metrics.histogram("llm_request_seconds", "Duration of ChatGPT requests", ("kind",))
+LLM_ERRORS = metrics.counter("llm_errors_total", "Failed ChatGPT requests", ("error",))
+LLM_TOKENS = metrics.counter("llm_tokens_total", "Tokens used by ChatGPT requests", ("type",))
+QUOTA_REJECTED = metrics.counter("quota_rejected_total", "Requests rejected by user quotas", ("mode", "limit"))
+COALESCED = metrics.counter("llm_coalesced_total", "ChatGPT requests answered by an identical request in flight",
+                            ("mode",))
+CACHE_LOOKUPS = metrics.counter("response_cache_lookups_total", "Response cache lookups", ("mode", "result"))
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Log the duration of a block as a span of the current trace when `TRACING` is enabled."""
+    if not TRACING:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace_logger.info(json.dumps({
+            "trace": _trace_id.get(),
+            "span": name,
+            "ms": round((time.perf_counter() - started) * 1000, 2),
+            **attributes
+        }))
+
+
+def instrument_handler(callback: Callable) -> Callable:
+    """Wrap an update handler to record its duration, errors and the received command."""
+    name = callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(update, context, *args):
+        _trace_id.set(next(_trace_ids))
+        message = getattr(update, "message", None)
+        if message is not None and message.text and message.text.startswith("/"):
+            COMMANDS.inc(command=message.text.split()[0].split("@")[0][1:])
+        started = time.perf_counter()
+        try:
+            with span(f"handler.{name}"):
+                return await callback(update, context, *args)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, handler=name)
+
+    return wrapper
+
+
+async def serve_metrics(host: str, port: int) -> None:
+    """Serve `GET /metrics` in the Prometheus text format."""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", metrics.render().encode("utf-8")
+            else:
+                status, body = "404 Not Found", b"Not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except (ConnectionError, UnicodeDecodeError) as e:
+            logger.debug(f"Metrics request failed: {e}")
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from src.config import PERSISTENCE_BACKEND, PERSISTENCE_PATH, PERSISTENCE_FLUSH_INTERVAL, REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+USER_DATA = "user_data"
+CHAT_DATA = "chat_data"
+
+
+class MemoryStore:
+    """
+    In-process stand-in for Redis.
+    Implements the subset of the `redis.asyncio.Redis` hash commands used by
+    `KeyValuePersistence`, so it can replace Redis locally.
+    """
+
+    def __init__(self):
+        self._hashes: dict[str, dict[str, str]] = {}
+
+    async def hgetall(self, name: str) -> dict[str, str]:
+        return dict(self._hashes.get(name, {}))
+
+    async def hset(self, name: str, mapping: dict[str, str]) -> int:
+        self._hashes.setdefault(name, {}).update(mapping)
+        return len(mapping)
+
+    async def hdel(self, name: str, *keys: str) -> int:
+        values = self._hashes.get(name, {})
+        return sum(values.pop(key, None) is not None for key in keys)
+
+    async def aclose(self) -> None:
+        pass
+
+
+class SQLiteStore:
+    """Redis-like hash commands backed by a local SQLite file."""
+
+    def __init__(self, path: str):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS hashes (name TEXT, key TEXT, value TEXT, PRIMARY KEY (name, key))"
+            )
+
+    async def hgetall(self, name: str) -> dict[str, str]:
+        return await asyncio.to_thread(self._hgetall, name)
+
+    async def hset(self, name: str, mapping: dict[str, str]) -> int:
+        return await asyncio.to_thread(self._hset, name, mapping)
+
+    async def hdel(self, name: str, *keys: str) -> int:
+        return await asyncio.to_thread(self._hdel, name, keys)
+
+    async def aclose(self) -> None:
+        self._connection.close()
+
+    def _hgetall(self, name: str) -> dict[str, str]:
+        with self._lock:
+            rows = self._connection.execute("SELECT key, value FROM hashes WHERE name = ?", (name,)).fetchall()
+        return dict(rows)
+
+    def _hset(self, name: str, mapping: dict[str, str]) -> int:
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO hashes (name, key, value) VALUES (?, ?, ?)",
+                [(name, key, value) for key, value in mapping.items()]
+            )
+        return len(mapping)
+
+    def _hdel(self, name: str, keys: tuple[str, ...]) -> int:
+        with self._lock, self._connection:
+            cursor = self._connection.executemany(
+                "DELETE FROM hashes WHERE name = ? AND key = ?", [(name, key) for key in keys]
+            )
+        return cursor.rowcount
+
+
+class KeyValuePersistence(BasePersistence):
+    """
+    Persistence of `user_data` and `chat_data` in a Redis-compatible hash store.
+    Every user and chat is stored as its own JSON entry. Changed entries are
+    collected in memory and written in one batch every `flush_interval` seconds,
+    so the cost of a flush depends on the number of changed chats only.
+    """
+
+    def __init__(self, store, flush_interval: float = PERSISTENCE_FLUSH_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, callback_data=False),
+            update_interval=flush_interval
+        )
+        self.store = store
+        self.flush_interval = flush_interval
+        # pending writes per hash: id -> JSON, or None for deleted entries
+        self._pending: dict[str, dict[str, str | None]] = {USER_DATA: {}, CHAT_DATA: {}}
+        self._flush_task = None
+
+    async def get_user_data(self) -> dict[int, dict]:
+        return await self._load(USER_DATA)
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        return await self._load(CHAT_DATA)
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._schedule(USER_DATA, user_id, json.dumps(data))
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._schedule(CHAT_DATA, chat_id, json.dumps(data))
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._schedule(USER_DATA, user_id, None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._schedule(CHAT_DATA, chat_id, None)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self._write()
+        await self.store.aclose()
+
+    async def _load(self, name: str) -> dict[int, dict]:
+        values = await self.store.hgetall(name)
+        return {int(key): json.loads(value) for key, value in values.items()}
+
+    def _schedule(self, name: str, entry_id: int, value: str | None) -> None:
+        self._pending[name][str(entry_id)] = value
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        self._flush_task = None
+        try:
+            await self._write()
+        except Exception as e:
+            logger.error(f"An error occurred while saving the bot state: {e}")
+
+    async def _write(self) -> None:
+        for name, pending in self._pending.items():
+            if not pending:
+                continue
+            self._pending[name] = {}
+            updated = {key: value for key, value in pending.items() if value is not None}
+            deleted = [key for key, value in pending.items() if value is None]
+            try:
+                if updated:
+                    await self.store.hset(name, mapping=updated)
+                if deleted:
+                    await self.store.hdel(name, *deleted)
+            except Exception:
+                # keep the batch for the next flush, newer values take precedence
+                self._pending[name] = {**pending, **self._pending[name]}
+                raise
+
+
+def create_store():
+    """Build the hash store selected by `PERSISTENCE_BACKEND`, or None to keep state in memory only."""
+    if PERSISTENCE_BACKEND == "sqlite":
+        return SQLiteStore(PERSISTENCE_PATH)
+    if PERSISTENCE_BACKEND == "redis":
+        import redis.asyncio
+
+        return redis.asyncio.from_url(REDIS_URL, decode_responses=True)
+    if PERSISTENCE_BACKEND == "memory":
+        return MemoryStore()
+    return None
+
+
+def create_persistence() -> KeyValuePersistence | None:
+    """Build the persistence selected by `PERSISTENCE_BACKEND`, or None to keep state in memory only."""
+    store = create_store()
+    return KeyValuePersistence(store) if store is not None else None
@@ -0,0 +1,67 @@
+import hashlib
+import json
+import os
+
+from src.resource_registry import RESOURCES_DIR
+
+
+def personality_id(key: str) -> int:
+    """Stable 16-bit id of a personality, derived from its key so it survives adding and removing others."""
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:2], "big")
+
+
+class Personality:
+    __slots__ = ("key", "id", "name", "title")
+
+    def __init__(self, key: str, name: str, title: str):
+        # name of the prompt and the image, e.g. "talk_linus_torvalds"
+        self.key = key
+        # id in the callback_data of the selection button
+        self.id = personality_id(key)
+        self.name = name
+        # text of the selection button
+        self.title = title
+
+
+class PersonalityRegistry:
+    """
+    Personalities of /talk, discovered from `prompts/talk_*.txt` files that have
+    a matching `images/talk_*.jpg`. Adding a personality only needs these two
+    files; an optional button title can be set in `personalities.json`.
+    Personalities are addressed by their `id` in callback_data, so buttons of
+    older messages keep pointing at the same personality.
+    """
+
+    def __init__(self, root: str):
+        titles = {}
+        titles_path = os.path.join(root, "personalities.json")
+        if os.path.exists(titles_path):
+            with open(titles_path, "r", encoding="utf-8") as file:
+                titles = json.load(file)
+        self.items: list[Personality] = []
+        for file_name in sorted(os.listdir(os.path.join(root, "prompts"))):
+            key, extension = os.path.splitext(file_name)
+            if not key.startswith("talk_") or extension != ".txt":
+                continue
+            if not os.path.exists(os.path.join(root, "images", f"{key}.jpg")):
+                continue
+            name = key.removeprefix("talk_").replace("_", " ").title()
+            self.items.append(Personality(key, name, titles.get(key, name)))
+        self._keys = {personality.key: personality for personality in self.items}
+        self._ids: dict[int, Personality] = {}
+        for personality in self.items:
+            other = self._ids.setdefault(personality.id, personality)
+            if other is not personality:
+                raise ValueError(f"Personalities {other.key} and {personality.key} have the same id, rename one")
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def get(self, key: str) -> Personality | None:
+        return self._keys.get(key)
+
+    def by_id(self, personality_id: int) -> Personality | None:
+        return self._ids.get(personality_id)
+
+
+personalities = PersonalityRegistry(RESOURCES_DIR)
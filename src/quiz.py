@@ -1,9 +1,117 @@
+import asyncio
+import logging
+import os
+
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
+from src.callbacks import encode, MODE_QUIZ, ACTION_ANSWER, ACTION_NEXT
+from src.config import QUIZ_SINGLE_MESSAGE
 from src.constants import CLOSE_BUTTON
+from src.media_cache import media_cache
 from src.quiz_data import QUIZ_DATA
-from src.utils import send_text, send_image, send_text_buttons
+from src.utils import send_text_buttons
+
+logger = logging.getLogger(__name__)
+
+QUIZ_IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "images", "quiz_imgs")
+
+
+# answer buttons carry `question * QUIZ_MAX_OPTIONS + option`, so a button of an older
+# question message is graded against its own question
+QUIZ_MAX_OPTIONS = 8
+
+
+def build_quiz_keyboard(question: int, quiz_item: dict) -> InlineKeyboardMarkup:
+    keyboard = []
+
+    for index, option in enumerate(quiz_item["options"]):
+        keyboard.append([
+            InlineKeyboardButton(
+                text=option,
+                callback_data=encode(MODE_QUIZ, ACTION_ANSWER, question * QUIZ_MAX_OPTIONS + index)
+            )
+        ])
+
+    keyboard.append([
+        InlineKeyboardButton("Next", callback_data=encode(MODE_QUIZ, ACTION_NEXT, question)),
+        *(InlineKeyboardButton(text, callback_data=data) for data, text in CLOSE_BUTTON.items()),
+    ])
+
+    return InlineKeyboardMarkup(keyboard)
+
+
+# keyboards never change, so they are built once instead of on every question
+QUIZ_KEYBOARDS = [build_quiz_keyboard(question, quiz_item) for question, quiz_item in enumerate(QUIZ_DATA)]
+
+
+class QuizImages:
+    """
+    Question images ready to be sent.
+    `warm` prepares a question in a background thread while the user is still
+    answering the previous one: it checks the cached `file_id` against the file
+    on disk, or reads the file if it was never uploaded. Sending a warmed
+    question then needs no disk access. The first upload of an image is done by
+    one sender at a time; concurrent senders wait for it and reuse its `file_id`.
+    """
+
+    def __init__(self, quiz_data: list[dict]):
+        self.paths = [os.path.join(QUIZ_IMAGES_DIR, f"{quiz_item['image']}.jpg") for quiz_item in quiz_data]
+        self.file_ids: dict[int, str] = {}
+        self.files: dict[int, bytes] = {}
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._uploads: dict[int, asyncio.Lock] = {}
+
+    def warm(self, index: int) -> None:
+        if index >= len(self.paths) or index in self._tasks:
+            return
+        task = asyncio.create_task(asyncio.to_thread(self._load, index))
+        self._tasks[index] = task
+        task.add_done_callback(lambda _: self._tasks.pop(index, None))
+
+    async def send(self, update: Update, context: ContextTypes.DEFAULT_TYPE, index: int, **kwargs):
+        """Send the image of question `index`; extra arguments are passed to `send_photo`."""
+        file_id = self.file_ids.get(index)
+        if file_id:
+            try:
+                return await context.bot.send_photo(chat_id=update.effective_chat.id, photo=file_id, **kwargs)
+            except BadRequest:
+                # file_id is not valid anymore (e.g. the bot token has changed)
+                self.file_ids.pop(index, None)
+                media_cache.invalidate(self.paths[index])
+        task = self._tasks.get(index)
+        if task is not None:
+            await task
+        elif index not in self.files:
+            await asyncio.to_thread(self._load, index)
+        async with self._uploads.setdefault(index, asyncio.Lock()):
+            if index not in self.file_ids:
+                photo = self.files.get(index)
+                if photo is None:
+                    raise FileNotFoundError(self.paths[index])
+                message = await context.bot.send_photo(chat_id=update.effective_chat.id, photo=photo, **kwargs)
+                self.file_ids[index] = message.photo[-1].file_id
+                # the bytes are only dropped once the file_id can be used instead
+                self.files.pop(index, None)
+                media_cache.set(self.paths[index], self.file_ids[index])
+                return message
+        return await self.send(update, context, index, **kwargs)
+
+    def _load(self, index: int) -> None:
+        try:
+            file_id = media_cache.get(self.paths[index])
+            if file_id:
+                self.file_ids[index] = file_id
+                return
+            self.file_ids.pop(index, None)
+            with open(self.paths[index], "rb") as image:
+                self.files[index] = image.read()
+        except OSError as e:
+            logger.error(f"An error occurred while loading the quiz image {self.paths[index]}: {e}")
+
+
+quiz_images = QuizImages(QUIZ_DATA)
 
 
 async def quiz(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -38,58 +146,44 @@ async def send_quiz_question(update, context):
 
     quiz_item = QUIZ_DATA[idx]
 
-    await send_image(update, context, quiz_item["image"], folder="quiz_imgs")
-
-    keyboard = []
-
-    for option in quiz_item["options"]:
-        keyboard.append([
-            InlineKeyboardButton(
-                text=option,
-                callback_data=f"quiz_answer:{option}"
-            )
-        ])
-
-    keyboard.append([
-        InlineKeyboardButton("Next", callback_data="quiz_next"),
-        InlineKeyboardButton("Close", callback_data="start"),
-    ])
-
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    if QUIZ_SINGLE_MESSAGE:
+        await quiz_images.send(update, context, idx, caption=quiz_item["question"], reply_markup=QUIZ_KEYBOARDS[idx])
+    else:
+        await quiz_images.send(update, context, idx)
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=quiz_item["question"],
+            reply_markup=QUIZ_KEYBOARDS[idx]
+        )
 
-    await context.bot.send_message(
-        chat_id=update.effective_chat.id,
-        text=quiz_item["question"],
-        reply_markup=reply_markup
-    )
+    # prepare the next question while the user answers this one
+    quiz_images.warm(idx + 1)
 
 
-async def quiz_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def quiz_answer(update: Update, context: ContextTypes.DEFAULT_TYPE, index: int):
     """
-    Handle quiz inline button actions.
-    Processes answer selection and moves to the next question
-    when requested.
+    Check an answer; `index` packs the question and the chosen option.
     """
     query = update.callback_query
-    await query.answer()
-
-    data = query.data
+    question, option = divmod(index, QUIZ_MAX_OPTIONS)
+    if "quiz_index" not in context.user_data or question >= len(QUIZ_DATA) \
+            or option >= len(QUIZ_DATA[question]["options"]):
+        return
 
-    # answer of quiz question
-    if data.startswith("quiz_answer:"):
-        selected = data.split(":")[1]
-        idx = context.user_data["quiz_index"]
-        correct = QUIZ_DATA[idx]["correct"]
+    selected = QUIZ_DATA[question]["options"][option]
+    correct = QUIZ_DATA[question]["correct"]
 
-        if selected == correct:
-            await query.message.reply_text("✅ Correct")
-        else:
-            await query.message.reply_text(f"❌ Wrong. Correct: {correct}")
+    if selected == correct:
+        await query.message.reply_text("✅ Correct")
+    else:
+        await query.message.reply_text(f"❌ Wrong. Correct: {correct}")
 
-        return
 
-    # next question
-    if data == "quiz_next":
-        context.user_data["quiz_index"] += 1
-        await send_quiz_question(update, context)
+async def quiz_next(update: Update, context: ContextTypes.DEFAULT_TYPE, index: int):
+    """
+    Move to the question after `index`, the question of the pressed button.
+    """
+    if "quiz_index" not in context.user_data:
         return
+    context.user_data["quiz_index"] = index + 1
+    await send_quiz_question(update, context)
@@ -0,0 +1,222 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from src.config import QUOTA_REQUESTS, QUOTA_WINDOW, QUOTA_DAILY_TOKENS, PERSISTENCE_FLUSH_INTERVAL
+from src.metrics import QUOTA_REJECTED
+from src.persistence import create_store
+
+logger = logging.getLogger(__name__)
+
+QUOTAS = "quotas"
+DAY = 86400
+
+# tokens used by ChatGPT requests of the update being handled
+_tokens_used: ContextVar[list[int] | None] = ContextVar("tokens_used", default=None)
+
+
+def parse_limits(value: str) -> dict[str, int]:
+    """Parse a "mode:limit,mode:limit" list, skipping modes without a positive limit."""
+    limits = {}
+    for item in value.split(","):
+        mode, _, limit = item.partition(":")
+        if mode.strip() and limit.strip() and int(limit) > 0:
+            limits[mode.strip()] = int(limit)
+    return limits
+
+
+def record_tokens(tokens: int) -> None:
+    """Count tokens of a ChatGPT request against the quota tracked by `QuotaManager.track`."""
+    used = _tokens_used.get()
+    if used is not None:
+        used[0] += tokens
+
+
+class QuotaState:
+    """
+    Usage of one mode by one user: request counts of the current and the
+    previous window, and tokens used on `day`.
+    """
+    __slots__ = ("window_start", "previous", "current", "day", "tokens")
+
+    def __init__(self, window_start: float = 0.0, previous: int = 0, current: int = 0, day: int = 0,
+                 tokens: int = 0):
+        self.window_start = window_start
+        self.previous = previous
+        self.current = current
+        self.day = day
+        self.tokens = tokens
+
+
+class QuotaManager:
+    """
+    Per-user limits of the ChatGPT modes.
+    Requests are limited with a sliding window counter: the count of the
+    previous window is weighted by how much of it still overlaps the sliding
+    window, so every user and mode costs a handful of numbers instead of a log
+    of timestamps. Tokens are counted per UTC day. With a `store`, changed
+    states are written in batches every `flush_interval` seconds.
+    """
+
+    def __init__(self, requests: dict[str, int], window: float, daily_tokens: dict[str, int], store=None,
+                 flush_interval: float = PERSISTENCE_FLUSH_INTERVAL):
+        self.requests = requests
+        self.window = window
+        self.daily_tokens = daily_tokens
+        self.store = store
+        self.flush_interval = flush_interval
+        self.states: dict[tuple[int, str], QuotaState] = {}
+        self._dirty = set()
+        self._expired = set()
+        self._flush_task = None
+
+    def acquire(self, user_id: int, mode: str) -> float:
+        """
+        Count a request of `user_id` in `mode`.
+        Returns 0 if it is allowed, otherwise the seconds until the user may try again.
+        """
+        limit = self.requests.get(mode)
+        budget = self.daily_tokens.get(mode)
+        if not limit and not budget:
+            return 0.0
+        now = time.time()
+        state = self._state((user_id, mode), now)
+        if budget and state.tokens >= budget:
+            QUOTA_REJECTED.inc(mode=mode, limit="tokens")
+            return (state.day + 1) * DAY - now
+        if limit:
+            wait = self._window_wait(state, limit, now)
+            if wait > 0:
+                QUOTA_REJECTED.inc(mode=mode, limit="requests")
+                return wait
+            state.current += 1
+            self._schedule((user_id, mode))
+        return 0.0
+
+    def add_tokens(self, user_id: int, mode: str, tokens: int) -> None:
+        if mode not in self.daily_tokens:
+            return
+        state = self._state((user_id, mode), time.time())
+        state.tokens += tokens
+        self._schedule((user_id, mode))
+
+    @contextmanager
+    def track(self, user_id: int, mode: str):
+        """Count tokens of all ChatGPT requests made inside the block against the daily budget of the user."""
+        used = [0]
+        token = _tokens_used.set(used)
+        try:
+            yield
+        finally:
+            _tokens_used.reset(token)
+            if used[0]:
+                self.add_tokens(user_id, mode, used[0])
+
+    async def load(self) -> None:
+        if self.store is None:
+            return
+        values = await self.store.hgetall(QUOTAS)
+        for key, value in values.items():
+            user_id, _, mode = key.partition(":")
+            self.states[(int(user_id), mode)] = QuotaState(*json.loads(value))
+
+    async def run(self) -> None:
+        """Background loop that forgets users with nothing left to enforce."""
+        while True:
+            await asyncio.sleep(self.window)
+            self.prune(time.time())
+
+    def prune(self, now: float) -> None:
+        today = int(now // DAY)
+        for key, state in list(self.states.items()):
+            idle = state.window_start < now - 2 * self.window
+            if idle and (state.day != today or not state.tokens):
+                del self.states[key]
+                if self.store is not None:
+                    self._dirty.discard(key)
+                    self._expired.add(key)
+        if self._expired and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self.store is not None:
+            await self._write()
+            await self.store.aclose()
+
+    def _state(self, key: tuple[int, str], now: float) -> QuotaState:
+        state = self.states.get(key)
+        if state is None:
+            state = self.states[key] = QuotaState()
+        window_start = now - now % self.window
+        if state.window_start != window_start:
+            adjacent = window_start - state.window_start == self.window
+            state.previous = state.current if adjacent else 0
+            state.current = 0
+            state.window_start = window_start
+        day = int(now // DAY)
+        if state.day != day:
+            state.day = day
+            state.tokens = 0
+        return state
+
+    def _window_wait(self, state: QuotaState, limit: int, now: float) -> float:
+        elapsed = now - state.window_start
+        weight = 1 - elapsed / self.window
+        if state.previous * weight + state.current + 1 <= limit:
+            return 0.0
+        if state.current + 1 > limit:
+            # only possible after this window ends, when it becomes the weighted previous one
+            return self.window - elapsed + self.window * (1 - (limit - 1) / state.current)
+        return self.window * (1 - (limit - state.current - 1) / state.previous) - elapsed
+
+    def _schedule(self, key: tuple[int, str]) -> None:
+        if self.store is None:
+            return
+        self._dirty.add(key)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        self._flush_task = None
+        try:
+            await self._write()
+        except Exception as e:
+            logger.error(f"An error occurred while saving the quotas: {e}")
+
+    async def _write(self) -> None:
+        dirty, self._dirty = self._dirty, set()
+        expired, self._expired = self._expired, set()
+        updated = {
+            f"{user_id}:{mode}": json.dumps([state.window_start, state.previous, state.current, state.day,
+                                             state.tokens])
+            for (user_id, mode), state in ((key, self.states[key]) for key in dirty if key in self.states)
+        }
+        try:
+            if updated:
+                await self.store.hset(QUOTAS, mapping=updated)
+            if expired:
+                await self.store.hdel(QUOTAS, *(f"{user_id}:{mode}" for user_id, mode in expired))
+        except Exception:
+            # retry with the next flush
+            self._dirty |= dirty
+            self._expired |= expired
+            raise
+
+
+def create_quota_manager() -> QuotaManager:
+    return QuotaManager(
+        parse_limits(QUOTA_REQUESTS),
+        QUOTA_WINDOW,
+        parse_limits(QUOTA_DAILY_TOKENS),
+        store=create_store()
+    )
+
+
+quotas = create_quota_manager()
@@ -0,0 +1,169 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import timedelta
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from src.metrics import TELEGRAM_SECONDS, TELEGRAM_WAIT_SECONDS, span
+
+logger = logging.getLogger(__name__)
+
+# lower value is sent first
+PRIORITY_ANSWER = 0
+PRIORITY_COSMETIC = 1
+
+COSMETIC_ENDPOINTS = {"deleteMessage", "sendChatAction", "setMyCommands", "setChatMenuButton"}
+# endpoints that are not counted against the per-chat limit
+UNTHROTTLED_ENDPOINTS = {"answerCallbackQuery", "getMe", "getUpdates", "setWebhook", "deleteWebhook"}
+
+
+class Throttle:
+    """
+    Token bucket implemented as GCRA: `rate` requests per second with bursts of
+    up to `burst` requests. `reserve` books the next slot and returns how long
+    to wait for it.
+    """
+    __slots__ = ("interval", "tolerance", "tat")
+
+    def __init__(self, rate: float, burst: int):
+        self.interval = 1 / rate
+        self.tolerance = self.interval * (burst - 1)
+        # theoretical arrival time of the next request
+        self.tat = 0.0
+
+    def delay(self, now: float) -> float:
+        return max(self.tat - self.tolerance - now, 0.0)
+
+    def reserve(self, now: float) -> float:
+        delay = self.delay(now)
+        self.tat = max(self.tat, now) + self.interval
+        return delay
+
+    def pause(self, now: float, seconds: float) -> None:
+        self.tat = max(self.tat, now + seconds + self.tolerance)
+
+
+class OutboundRateLimiter(BaseRateLimiter[dict]):
+    """
+    Scheduler for outgoing Bot API requests.
+    Every request first waits for its chat bucket and then for the global bucket.
+    The global bucket serves waiting requests by priority, so answers go out
+    before cosmetic calls such as deleting placeholders. A `RetryAfter` from
+    Telegram pauses the affected bucket and the request is sent again.
+    The priority can be overridden with `rate_limit_args={"priority": ...}`.
+    """
+
+    def __init__(self, global_rate: float, chat_rate: float, group_rate: float, burst: int = 3,
+                 max_retries: int = 3):
+        self.global_throttle = Throttle(global_rate, burst)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self._chat_throttles: dict[int | str, Throttle] = {}
+        self._queue = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._scheduler = None
+        self.chat_waiting = 0
+        self.sent = 0
+        self.retries = 0
+
+    async def initialize(self) -> None:
+        if self._scheduler is None:
+            self._scheduler = asyncio.create_task(self._schedule())
+
+    async def shutdown(self) -> None:
+        if self._scheduler is not None:
+            self._scheduler.cancel()
+            self._scheduler = None
+
+    def stats(self) -> dict:
+        """Queue depth and counters of the scheduler."""
+        return {
+            "global_queue": len(self._queue),
+            "chat_queue": self.chat_waiting,
+            "chats": len(self._chat_throttles),
+            "sent": self.sent,
+            "retries": self.retries,
+        }
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        priority = (rate_limit_args or {}).get(
+            "priority", PRIORITY_COSMETIC if endpoint in COSMETIC_ENDPOINTS else PRIORITY_ANSWER
+        )
+        throttled = endpoint not in UNTHROTTLED_ENDPOINTS
+        for attempt in range(self.max_retries + 1):
+            if throttled:
+                with TELEGRAM_WAIT_SECONDS.time(endpoint=endpoint):
+                    await self._acquire(chat_id, priority)
+            try:
+                with TELEGRAM_SECONDS.time(endpoint=endpoint), span(f"telegram.{endpoint}"):
+                    result = await callback(*args, **kwargs)
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                self.retries += 1
+                logger.warning(f"Flood limit hit on {endpoint}, retrying in {retry_after}s")
+                throttle = self._chat_throttle(chat_id) if chat_id is not None else self.global_throttle
+                throttle.pause(time.monotonic(), retry_after)
+
+    async def _acquire(self, chat_id, priority: int) -> None:
+        if chat_id is not None:
+            delay = self._chat_throttle(chat_id).reserve(time.monotonic())
+            if delay:
+                self.chat_waiting += 1
+                try:
+                    await asyncio.sleep(delay)
+                finally:
+                    self.chat_waiting -= 1
+        if self._scheduler is None:
+            await self.initialize()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._counter), future))
+        self._wakeup.set()
+        await future
+
+    def _chat_throttle(self, chat_id) -> Throttle:
+        throttle = self._chat_throttles.get(chat_id)
+        if throttle is None:
+            # negative ids are groups and channels, which have stricter limits
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            throttle = Throttle(self.group_rate if is_group else self.chat_rate, self.burst)
+            self._chat_throttles[chat_id] = throttle
+        return throttle
+
+    async def _schedule(self) -> None:
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = self.global_throttle.delay(time.monotonic())
+            if delay:
+                await asyncio.sleep(delay)
+            _, _, future = heapq.heappop(self._queue)
+            if future.cancelled():
+                continue
+            self.global_throttle.reserve(time.monotonic())
+            future.set_result(None)
+            self._prune()
+
+    def _prune(self) -> None:
+        # forget buckets of chats that have been idle long enough to be full again
+        if len(self._chat_throttles) < 10000:
+            return
+        now = time.monotonic()
+        self._chat_throttles = {
+            chat_id: throttle for chat_id, throttle in self._chat_throttles.items() if throttle.tat > now
+        }
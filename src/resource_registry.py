@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import os
+from types import MappingProxyType
+
+from src.config import RESOURCES_RELOAD_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources')
+
+
+class ResourceRegistry:
+    """
+    In-memory registry of text resources (prompts and messages).
+    All `.txt` files of the given folders are read once at startup into an
+    immutable mapping, so lookups need no disk I/O. `watch` polls the folders
+    and swaps in a freshly loaded mapping when a file changes.
+    """
+
+    def __init__(self, root: str, folders: tuple[str, ...] = ("prompts", "messages")):
+        self.root = root
+        self.folders = folders
+        self._resources = MappingProxyType({})
+        self._snapshot = {}
+        self.load()
+
+    def get(self, folder: str, name: str) -> str:
+        return self._resources[(folder, name)]
+
+    def names(self, folder: str) -> list[str]:
+        return sorted(name for resource_folder, name in self._resources if resource_folder == folder)
+
+    def load(self) -> None:
+        """Read all resources and replace the current mapping in one step."""
+        snapshot = self._scan()
+        resources = {}
+        for key, (path, _) in snapshot.items():
+            with open(path, "r", encoding="utf-8") as file:
+                resources[key] = file.read()
+        self._resources = MappingProxyType(resources)
+        self._snapshot = snapshot
+
+    async def watch(self, interval: float = RESOURCES_RELOAD_INTERVAL) -> None:
+        """Reload resources whenever a file is added, removed or modified."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                snapshot = await asyncio.to_thread(self._scan)
+                if snapshot != self._snapshot:
+                    await asyncio.to_thread(self.load)
+                    logger.info("Resources reloaded")
+            except OSError as e:
+                logger.error(f"An error occurred while reloading resources: {e}")
+
+    def _scan(self) -> dict:
+        snapshot = {}
+        for folder in self.folders:
+            folder_path = os.path.join(self.root, folder)
+            for file_name in os.listdir(folder_path):
+                name, extension = os.path.splitext(file_name)
+                if extension != ".txt":
+                    continue
+                path = os.path.join(folder_path, file_name)
+                snapshot[(folder, name)] = (path, os.stat(path).st_mtime_ns)
+        return snapshot
+
+
+resources = ResourceRegistry(RESOURCES_DIR)
@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from src.config import (RESPONSE_CACHE_BACKEND, RESPONSE_CACHE_PATH, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL,
+                        RESPONSE_CACHE_MODES)
+from src.metrics import CACHE_LOOKUPS
+
+
+def make_key(prompt_text: str, message_text: str) -> str:
+    """Hash of the system prompt and the user message, ignoring case and extra whitespace."""
+    normalized = "\n".join(" ".join(text.lower().split()) for text in (prompt_text, message_text))
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with a TTL per entry."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    async def get(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        self._entries[key] = (time.time() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class SQLiteCacheBackend:
+    """
+    Cache stored in a local SQLite file, shared between restarts.
+    Queries run in a worker thread, so disk access never blocks the event loop.
+    """
+
+    def __init__(self, path: str, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)")
+        self._connection.commit()
+
+    async def get(self, key: str) -> str | None:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: str) -> None:
+        await asyncio.to_thread(self._set, key, value)
+
+    def _get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM responses WHERE key = ? AND expires_at >= ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            with self._connection:
+                self._connection.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def _set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl, now)
+            )
+            self._connection.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+            self._connection.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,)
+            )
+
+
+class ResponseCache:
+    """
+    Cache of ChatGPT answers for stateless requests.
+    Only modes listed in `modes` are cached (e.g. "gpt" and "talk" for the first
+    question of a conversation, "random" for random facts). Hits and misses are
+    counted per mode.
+    """
+
+    def __init__(self, backend, modes: set[str]):
+        self.backend = backend
+        self.modes = modes
+        self.hits = {}
+        self.misses = {}
+
+    def is_cacheable(self, mode: str | None) -> bool:
+        return mode in self.modes
+
+    async def get(self, mode: str, prompt_text: str, message_text: str) -> str | None:
+        value = await self.backend.get(make_key(prompt_text, message_text))
+        counter = self.misses if value is None else self.hits
+        counter[mode] = counter.get(mode, 0) + 1
+        CACHE_LOOKUPS.inc(mode=mode, result="miss" if value is None else "hit")
+        return value
+
+    async def set(self, prompt_text: str, message_text: str, value: str) -> None:
+        await self.backend.set(make_key(prompt_text, message_text), value)
+
+    def stats(self) -> dict:
+        return {"hits": dict(self.hits), "misses": dict(self.misses)}
+
+
+def create_response_cache() -> ResponseCache:
+    if RESPONSE_CACHE_BACKEND == "sqlite":
+        backend = SQLiteCacheBackend(os.path.abspath(RESPONSE_CACHE_PATH), RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+    else:
+        backend = MemoryCacheBackend(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+    modes = {mode.strip() for mode in RESPONSE_CACHE_MODES.split(",") if mode.strip()}
+    return ResponseCache(backend, modes)
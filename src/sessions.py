@@ -0,0 +1,112 @@
+import time
+from collections import OrderedDict, deque
+
+from src.tokens import count_tokens
+
+
+class ChatSession:
+    """
+    Conversation of a single chat.
+    Keeps the system prompt separately and the history as compact
+    `(role, content, tokens)` tuples, trimmed to `max_history` messages by `trim`.
+    Turns trimmed from the history can be folded into `summary`; trimmed turns
+    wait in `unsummarized` while a summary of earlier ones is being made.
+    """
+    __slots__ = ("prompt", "history", "tokens", "summary", "summary_tokens", "last_used", "max_history",
+                 "unsummarized", "summarizing")
+
+    def __init__(self, prompt: str, max_history: int):
+        self.prompt = prompt
+        self.history = deque()
+        self.tokens = 0
+        self.summary = ""
+        self.summary_tokens = 0
+        self.last_used = time.monotonic()
+        self.max_history = max_history
+        self.unsummarized = []
+        self.summarizing = False
+
+    def add(self, role: str, content: str) -> None:
+        tokens = count_tokens(content)
+        self.history.append((role, content, tokens))
+        self.tokens += tokens
+
+    def set_summary(self, summary: str) -> None:
+        self.summary = summary
+        self.summary_tokens = count_tokens(summary) if summary else 0
+
+    def trim(self, token_budget: int) -> list[tuple[str, str]]:
+        """
+        Drop the oldest turns until the history has at most `max_history` messages
+        and history and summary fit into `token_budget`. The latest question and
+        answer are always kept. Returns the dropped `(role, content)` pairs so the
+        caller can summarize them.
+        """
+        dropped = []
+        while len(self.history) > 2 and (len(self.history) > self.max_history
+                                         or self.tokens + self.summary_tokens > token_budget):
+            dropped.append(self._pop())
+        return dropped
+
+    def messages(self) -> list[dict]:
+        """Build the message list in the format expected by the OpenAI API."""
+        messages = [{"role": "system", "content": self.prompt}]
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"})
+        messages.extend({"role": role, "content": content} for role, content, _ in self.history)
+        return messages
+
+    def _pop(self) -> tuple[str, str]:
+        role, content, tokens = self.history.popleft()
+        self.tokens -= tokens
+        return role, content
+
+
+class SessionStore:
+    """
+    Chat sessions keyed by chat id.
+    Sessions are kept in LRU order: the least recently used one is evicted when
+    `max_sessions` is exceeded, and sessions idle for longer than `ttl` seconds
+    are dropped.
+    """
+
+    def __init__(self, max_sessions: int, ttl: float, max_history: int):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_history = max_history
+        self._sessions: OrderedDict[int, ChatSession] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, chat_id: int) -> ChatSession | None:
+        session = self._sessions.get(chat_id)
+        if session is None:
+            return None
+        now = time.monotonic()
+        if now - session.last_used > self.ttl:
+            del self._sessions[chat_id]
+            return None
+        session.last_used = now
+        self._sessions.move_to_end(chat_id)
+        return session
+
+    def reset(self, chat_id: int, prompt: str) -> ChatSession:
+        """Start a new conversation for the chat with the given system prompt."""
+        self._sessions.pop(chat_id, None)
+        session = ChatSession(prompt, self.max_history)
+        self._sessions[chat_id] = session
+        self._evict()
+        return session
+
+    def drop(self, chat_id: int) -> None:
+        self._sessions.pop(chat_id, None)
+
+    def _evict(self) -> None:
+        # sessions are ordered by last use, so expired ones are always at the front
+        now = time.monotonic()
+        while self._sessions:
+            chat_id, session = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - session.last_used <= self.ttl:
+                break
+            del self._sessions[chat_id]
@@ -0,0 +1,144 @@
+import asyncio
+import hmac
+import json
+import logging
+import multiprocessing
+import signal
+from typing import Callable
+
+from telegram import Bot, Update
+from telegram.error import TelegramError
+from telegram.ext import Application
+
+from src.config import (BOT_TOKEN, BOT_MODE, TELEGRAM_API_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH,
+                        WEBHOOK_URL, WEBHOOK_SECRET)
+from src.update_processor import chat_key
+
+logger = logging.getLogger(__name__)
+
+POLL_TIMEOUT = 30
+WORKER_STOP_TIMEOUT = 10
+
+
+def run_sharded(build_application: Callable[..., Application], workers: int) -> None:
+    """
+    Run the bot as a front process and `workers` worker processes.
+    The front receives updates (polling or webhook, see `BOT_MODE`) and routes
+    every update by chat id to one worker, which processes it with its own
+    application built by `build_application(with_updater=False)`.
+    """
+    context = multiprocessing.get_context("spawn")
+    queues = [context.Queue() for _ in range(workers)]
+    processes = [
+        context.Process(target=run_worker, args=(build_application, queue), name=f"worker-{index}")
+        for index, queue in enumerate(queues)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        asyncio.run(_run_front(queues))
+    finally:
+        for queue in queues:
+            queue.put(None)
+        for process in processes:
+            process.join(WORKER_STOP_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+
+
+def run_worker(build_application: Callable[..., Application], queue) -> None:
+    # the front process handles Ctrl+C and stops workers through the queue
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_serve_worker(build_application, queue))
+
+
+async def _serve_worker(build_application: Callable[..., Application], queue) -> None:
+    app = build_application(with_updater=False)
+    async with app:
+        if app.post_init:
+            await app.post_init(app)
+        await app.start()
+        try:
+            while True:
+                data = await asyncio.to_thread(queue.get)
+                if data is None:
+                    break
+                await app.update_queue.put(Update.de_json(data, app.bot))
+        finally:
+            await app.stop()
+            if app.post_shutdown:
+                await app.post_shutdown(app)
+
+
+async def _run_front(queues: list) -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    def dispatch(update: Update) -> None:
+        # updates of the same chat always go to the same worker and stay in order
+        key = chat_key(update)
+        queues[(update.update_id if key is None else key) % len(queues)].put(update.to_dict())
+
+    async with Bot(BOT_TOKEN, base_url=TELEGRAM_API_URL) as bot:
+        if BOT_MODE == "webhook":
+            receiver = asyncio.create_task(_receive_webhook(bot, dispatch))
+        else:
+            receiver = asyncio.create_task(_poll(bot, dispatch))
+        await stop.wait()
+        receiver.cancel()
+        try:
+            await receiver
+        except asyncio.CancelledError:
+            pass
+
+
+async def _poll(bot: Bot, dispatch: Callable[[Update], None]) -> None:
+    await bot.delete_webhook(drop_pending_updates=True)
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=POLL_TIMEOUT, allowed_updates=Update.ALL_TYPES)
+        except TelegramError as e:
+            logger.error(f"An error occurred while getting updates: {e}")
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            dispatch(update)
+            offset = update.update_id + 1
+
+
+async def _receive_webhook(bot: Bot, dispatch: Callable[[Update], None]) -> None:
+    import tornado.web
+
+    class WebhookHandler(tornado.web.RequestHandler):
+        async def post(self):
+            secret = self.request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+            if WEBHOOK_SECRET and not hmac.compare_digest(secret.encode("utf-8"), WEBHOOK_SECRET.encode("utf-8")):
+                self.set_status(403)
+                return
+            try:
+                update = Update.de_json(json.loads(self.request.body), bot)
+            except Exception as e:
+                # a malformed body is the sender's fault, whatever de_json raised on it
+                logger.error(f"An error occurred while parsing a webhook update: {e}")
+                self.set_status(400)
+                return
+            dispatch(update)
+            self.set_status(200)
+
+    server = tornado.web.Application([(f"/{WEBHOOK_PATH}", WebhookHandler)]).listen(
+        WEBHOOK_PORT, address=WEBHOOK_LISTEN
+    )
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=True
+        )
+    try:
+        await asyncio.Event().wait()
+    finally:
+        server.stop()
@@ -0,0 +1,50 @@
+import asyncio
+from contextlib import contextmanager
+
+from src.metrics import COALESCED
+
+
+class SingleFlight:
+    """
+    Deduplication of identical concurrent requests.
+    The first caller for a key becomes the leader and makes the request inside
+    `lead`; callers arriving while it is in flight `follow` it and receive the
+    same answer or exception instead of making their own request.
+    """
+
+    def __init__(self):
+        self.calls: dict[str, asyncio.Future] = {}
+
+    async def follow(self, key: str, mode: str | None = None) -> str | None:
+        """Wait for the answer of the request in flight for `key`, or return None if there is none."""
+        future = self.calls.get(key)
+        if future is None:
+            return None
+        try:
+            answer = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # the leader was cancelled before it got an answer, the caller has to make its own request
+            if future.cancelled():
+                return None
+            raise
+        COALESCED.inc(mode=mode)
+        return answer
+
+    @contextmanager
+    def lead(self, key: str):
+        """Register a request for `key`; the block passes the answer to followers with `set_result`."""
+        future = asyncio.get_running_loop().create_future()
+        self.calls[key] = future
+        try:
+            yield future
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+                # mark the exception as retrieved in case nobody followed
+                future.exception()
+            raise
+        finally:
+            if self.calls.get(key) is future:
+                del self.calls[key]
+            if not future.done():
+                future.cancel()
@@ -1,17 +1,16 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 
+from src.callbacks import encode, MODE_TALK, ACTION_PICK
 from src.constants import CLOSE_BUTTON
-from src.utils import send_image, send_text_buttons
+from src.personalities import personalities
+from src.utils import send_image_text
 
 
 async def talk(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
-    await send_image(update, context, "talk")
-    personalities = {
-        "talk_linus_torvalds": "Linus Torvalds (Linux, Git)",
-        "talk_guido_van_rossum": "Guido van Rossum (Python)",
-        "talk_mark_zuckerberg": "Mark Zuckerberg (Meta, Facebook)",
+    buttons = {
+        **{encode(MODE_TALK, ACTION_PICK, personality.id): personality.title for personality in personalities.items},
         **CLOSE_BUTTON,
     }
-    await send_text_buttons(update, context, "Choose a personality to chat with ...", personalities)
+    await send_image_text(update, context, "talk", "Choose a personality to chat with ...", buttons)
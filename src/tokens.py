@@ -0,0 +1,22 @@
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken is optional
+    tiktoken = None
+
+# every chat message costs a few tokens on top of its content
+MESSAGE_OVERHEAD = 4
+
+if tiktoken is not None:
+    _encoding = tiktoken.get_encoding("cl100k_base")
+else:
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens of a message content.
+    Uses tiktoken when it is installed, otherwise estimates ~4 characters per token.
+    """
+    if _encoding is not None:
+        return len(_encoding.encode(text)) + MESSAGE_OVERHEAD
+    return len(text) // 4 + 1 + MESSAGE_OVERHEAD
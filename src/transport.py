@@ -0,0 +1,89 @@
+import importlib.util
+import logging
+import time
+
+import httpx
+import openai
+
+from src.config import (OPENAI_PROXY, OPENAI_HTTP2, OPENAI_TIMEOUT, OPENAI_CONNECT_TIMEOUT,
+                        OPENAI_KEEPALIVE, BREAKER_FAILURES, BREAKER_RESET_TIMEOUT)
+
+logger = logging.getLogger(__name__)
+
+# failures that say nothing about the request itself, only about the upstream health
+UPSTREAM_ERRORS = (
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+    openai.RateLimitError,
+)
+
+
+class UpstreamUnavailableError(Exception):
+    """Raised without calling the API while the circuit breaker is open."""
+
+
+def create_http_client(max_connections: int) -> httpx.AsyncClient:
+    """
+    HTTP client for the OpenAI API.
+    Keeps a pool of up to `max_connections` keep-alive connections,
+    uses HTTP/2 when the `h2` package is installed and routes through
+    `OPENAI_PROXY` if it is set.
+    """
+    http2 = OPENAI_HTTP2 and importlib.util.find_spec("h2") is not None
+    return httpx.AsyncClient(
+        proxy=OPENAI_PROXY or None,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=OPENAI_KEEPALIVE
+        ),
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+    )
+
+
+class CircuitBreaker:
+    """
+    Stops calling an unhealthy upstream.
+    After `failure_threshold` failures in a row the circuit opens and `check`
+    fails fast. Once `reset_timeout` seconds have passed a single trial request
+    is let through: success closes the circuit, failure opens it again.
+    A trial that ends without telling anything about the upstream, e.g. cancelled,
+    is released with `release_trial` so that the next request becomes the trial.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURES, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def check(self) -> None:
+        if self.opened_at is None:
+            return
+        if self.trial_running or time.monotonic() - self.opened_at < self.reset_timeout:
+            raise UpstreamUnavailableError("ChatGPT is temporarily unavailable")
+        self.trial_running = True
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("Circuit breaker closed")
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def release_trial(self) -> None:
+        self.trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.trial_running = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Circuit breaker opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
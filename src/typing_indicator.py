@@ -0,0 +1,49 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from telegram import Bot
+from telegram.constants import ChatAction
+from telegram.error import TelegramError
+
+from src.config import TYPING_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class TypingIndicator:
+    """
+    "typing..." status of chats while answers are prepared.
+    Telegram shows a chat action for about five seconds, so it is sent again
+    every `interval` seconds while a request of the chat is in flight.
+    Concurrent requests of the same chat share one refresh task.
+    """
+
+    def __init__(self, interval: float = TYPING_INTERVAL):
+        self.interval = interval
+        self._requests: dict[int, int] = {}
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    @asynccontextmanager
+    async def typing(self, bot: Bot, chat_id: int):
+        self._requests[chat_id] = self._requests.get(chat_id, 0) + 1
+        if chat_id not in self._tasks:
+            self._tasks[chat_id] = asyncio.create_task(self._refresh(bot, chat_id))
+        try:
+            yield
+        finally:
+            self._requests[chat_id] -= 1
+            if not self._requests[chat_id]:
+                del self._requests[chat_id]
+                self._tasks.pop(chat_id).cancel()
+
+    async def _refresh(self, bot: Bot, chat_id: int) -> None:
+        while True:
+            try:
+                await bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+            except TelegramError as e:
+                logger.warning(f"Could not send the typing status to chat {chat_id}: {e}")
+            await asyncio.sleep(self.interval)
+
+
+typing_indicator = TypingIndicator()
@@ -0,0 +1,99 @@
+import logging
+from collections import deque
+from typing import Any, Awaitable
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def chat_key(update: object) -> int | None:
+    """Updates of the same chat share a key; updates without a chat or user have none."""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return None
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Processes updates of different chats concurrently and updates of one chat in order.
+    While a chat has an update in progress, its next updates wait in a per-chat queue
+    of at most `max_queue_depth` entries and are processed by the same task one by
+    one, so waiting updates do not take slots of `max_concurrent_updates`. A callback
+    press identical to one that is still queued or running (e.g. a double tap on
+    "Next") is dropped.
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_queue_depth: int):
+        super().__init__(max_concurrent_updates)
+        self.max_queue_depth = max_queue_depth
+        self._queues: dict[int, deque] = {}
+        self._callbacks: set[tuple[int, str]] = set()
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = chat_key(update)
+        if key is None:
+            await coroutine
+            return
+
+        callback = self._callback_key(key, update)
+        if callback is not None and callback in self._callbacks:
+            await self._drop(update, coroutine, "duplicate callback")
+            return
+
+        queue = self._queues.get(key)
+        if queue is not None:
+            if len(queue) >= self.max_queue_depth:
+                await self._drop(update, coroutine, "chat queue is full")
+                return
+            if callback is not None:
+                self._callbacks.add(callback)
+            queue.append((callback, coroutine))
+            return
+
+        queue = self._queues[key] = deque()
+        if callback is not None:
+            self._callbacks.add(callback)
+        try:
+            await self._run(callback, coroutine)
+            while queue:
+                await self._run(*queue.popleft())
+        finally:
+            del self._queues[key]
+
+    async def _run(self, callback: tuple[int, str] | None, coroutine: Awaitable[Any]) -> None:
+        try:
+            await coroutine
+        except Exception as e:
+            logger.error(f"An error occurred while processing an update: {e}")
+        finally:
+            self._callbacks.discard(callback)
+
+    @staticmethod
+    def _callback_key(key: int, update: object) -> tuple[int, str] | None:
+        if isinstance(update, Update) and update.callback_query and update.callback_query.data:
+            return key, update.callback_query.data
+        return None
+
+    @staticmethod
+    async def _drop(update: object, coroutine: Awaitable[Any], reason: str) -> None:
+        coroutine.close()
+        logger.warning(f"Update dropped: {reason}")
+        if isinstance(update, Update) and update.callback_query:
+            # stop the loading indicator on the pressed button
+            try:
+                await update.callback_query.answer()
+            except TelegramError:
+                pass
@@ -1,31 +1,88 @@
+import asyncio
+import hashlib
+import json
 import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 from telegram import (Update, BotCommand, BotCommandScopeChat, MenuButtonCommands, InlineKeyboardButton,
-                      InlineKeyboardMarkup)
+                      InlineKeyboardMarkup, Message)
+
+from src.chunking import MESSAGE_LIMIT, split_message, is_balanced_markdown
+from src.config import STREAM_EDIT_INTERVAL, WAITING_INDICATOR
+from src.constants import EMPTY_ANSWER_TEXT
+from src.media_cache import media_cache
+from src.resource_registry import resources
+from src.typing_indicator import typing_indicator
+
+# Telegram limit of photo captions
+CAPTION_LIMIT = 1024
 
 
 def load_message(name: str) -> str:
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    message_path = os.path.join(current_dir, 'resources', 'messages', f'{name}.txt')
-    with open(message_path, "r", encoding="utf-8") as file:
-        return file.read()
+    return resources.get("messages", name)
 
 
 async def send_text(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    """Send a Markdown text; chunks with unbalanced markup are sent as plain text instead of failing."""
     text = text.encode('utf8').decode('utf8')
-    return await context.bot.send_message(
-        chat_id=update.effective_chat.id,
-        text=text,
-        parse_mode=ParseMode.MARKDOWN
-    )
+    return await send_chunks(update, context, text, parse_mode=ParseMode.MARKDOWN)
+
+
+async def send_chunks(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                      reply_markup: InlineKeyboardMarkup | None = None, parse_mode: str | None = None):
+    """
+    Send a text of any length as consecutive messages of at most `MESSAGE_LIMIT` characters.
+    The text is split at paragraph and code block boundaries by `split_message`,
+    the keyboard is attached to the last message only, and with Markdown every
+    chunk is checked on its own and sent as plain text if its markup is unbalanced.
+    The chunks are sent one after another, as Telegram only keeps the order of
+    messages whose requests do not overlap. Returns the last message.
+    An empty text is replaced by `EMPTY_ANSWER_TEXT`, so the keyboard still arrives.
+    """
+    chunks = split_message(text) or [EMPTY_ANSWER_TEXT]
+    message = None
+    for index, chunk in enumerate(chunks):
+        last = index == len(chunks) - 1
+        message = await context.bot.send_message(
+            chat_id=update.effective_message.chat_id,
+            text=chunk,
+            parse_mode=parse_mode if parse_mode != ParseMode.MARKDOWN or is_balanced_markdown(chunk) else None,
+            reply_markup=reply_markup if last else None,
+            message_thread_id=update.effective_message.message_thread_id
+        )
+    return message
+
+
+@asynccontextmanager
+async def waiting(update: Update, context: ContextTypes.DEFAULT_TYPE, placeholder: str = "..."):
+    """
+    Show that an answer is being prepared while the block runs: the typing status of
+    the chat, or with `WAITING_INDICATOR` "placeholder" a message deleted afterwards.
+    """
+    if WAITING_INDICATOR != "placeholder":
+        async with typing_indicator.typing(context.bot, update.effective_chat.id):
+            yield
+        return
+    message = await send_text(update, context, placeholder)
+    try:
+        yield
+    finally:
+        await context.bot.delete_message(chat_id=update.effective_chat.id, message_id=message.message_id)
 
 
-async def send_image(update, context, name: str, folder: str | None = None):
+async def send_image(update, context, name: str, folder: str | None = None, caption: str | None = None,
+                     buttons: dict | None = None, parse_mode: str | None = None):
     """
     Send an image to the chat.
     Builds the image path from the project directory and sends the specified
     `.jpg` file to the current chat. Supports optional subfolders images.
+    After the first upload the image is sent by its cached Telegram `file_id`.
+    An optional caption and buttons are sent with the image in the same message.
     """
     current_dir = os.path.dirname(os.path.abspath(__file__))
 
@@ -38,45 +95,163 @@ async def send_image(update, context, name: str, folder: str | None = None):
             current_dir, 'resources', 'images', f'{name}.jpg'
         )
 
+    reply_markup = build_buttons(buttons) if buttons else None
+    file_id = media_cache.get(image_path)
+    if file_id:
+        try:
+            return await context.bot.send_photo(
+                chat_id=update.effective_chat.id,
+                photo=file_id,
+                caption=caption,
+                parse_mode=parse_mode,
+                reply_markup=reply_markup
+            )
+        except BadRequest:
+            # file_id is not valid anymore (e.g. the bot token has changed)
+            media_cache.invalidate(image_path)
+
     with open(image_path, 'rb') as image:
-        return await context.bot.send_photo(
+        message = await context.bot.send_photo(
             chat_id=update.effective_chat.id,
-            photo=image
+            photo=image,
+            caption=caption,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup
         )
+    media_cache.set(image_path, message.photo[-1].file_id)
+    return message
+
+
+async def send_image_text(update: Update, context: ContextTypes.DEFAULT_TYPE, name: str, text: str,
+                          buttons: dict | None = None, folder: str | None = None, parse_mode: str | None = None):
+    """
+    Send an image and a text in one request, as a captioned photo.
+    Texts longer than a caption allows are sent as a second message after the image.
+    """
+    if len(text) <= CAPTION_LIMIT:
+        return await send_image(update, context, name, folder, caption=text, buttons=buttons, parse_mode=parse_mode)
+    await send_image(update, context, name, folder)
+    return await send_chunks(update, context, text, build_buttons(buttons) if buttons else None, parse_mode)
+
+
+async def edit_caption(update: Update, context: ContextTypes.DEFAULT_TYPE, message: Message, text: str,
+                       buttons: dict | None = None):
+    """Replace the caption of a photo sent by `send_image`, falling back to a new message for long texts."""
+    if len(text) <= CAPTION_LIMIT:
+        return await message.edit_caption(caption=text, reply_markup=build_buttons(buttons) if buttons else None)
+    await message.edit_caption(caption=None)
+    if buttons:
+        return await send_text_buttons(update, context, text, buttons)
+    return await send_text(update, context, text)
+
+
+async def send_batch(*calls):
+    """
+    Run independent Bot API calls concurrently and return their results in order.
+    Only for calls whose order does not matter, messages may arrive in any order.
+    """
+    return await asyncio.gather(*calls)
 
 
 async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, commands: dict):
+    """
+    Set the command menu of the chat.
+    The commands are remembered in `chat_data`, so the menu is only sent again when they change.
+    """
+    digest = hashlib.sha1(json.dumps(commands, sort_keys=True).encode("utf-8")).hexdigest()
+    if context.chat_data.get("menu_commands") == digest:
+        return
     command_list = [
         BotCommand(command=key, description=value)
         for key, value in commands.items()
     ]
-    await context.bot.set_my_commands(
-        command_list,
-        scope=BotCommandScopeChat(chat_id=update.effective_chat.id)
-    )
-    await context.bot.set_chat_menu_button(
-        menu_button=MenuButtonCommands(),
-        chat_id=update.effective_chat.id
+    await send_batch(
+        context.bot.set_my_commands(
+            command_list,
+            scope=BotCommandScopeChat(chat_id=update.effective_chat.id)
+        ),
+        context.bot.set_chat_menu_button(
+            menu_button=MenuButtonCommands(),
+            chat_id=update.effective_chat.id
+        )
     )
+    context.chat_data["menu_commands"] = digest
 
 
 def load_prompt(name: str):
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    prompt_path = os.path.join(current_dir, 'resources', 'prompts', f'{name}.txt')
-    with open(prompt_path, "r", encoding="utf-8") as file:
-        return file.read()
+    return resources.get("prompts", name)
 
 
-async def send_text_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, buttons: dict):
-    text = text.encode('utf8', errors='surrogatepass').decode('utf8')
+def build_buttons(buttons: dict) -> InlineKeyboardMarkup:
     keyboard = []
     for key, value in buttons.items():
         button = InlineKeyboardButton(str(value), callback_data=str(key))
         keyboard.append([button])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    return await context.bot.send_message(
-        chat_id=update.effective_message.chat_id,
-        text=text,
-        reply_markup=reply_markup,
-        message_thread_id=update.effective_message.message_thread_id
-    )
+    return InlineKeyboardMarkup(keyboard)
+
+
+async def send_text_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, buttons: dict):
+    text = text.encode('utf8', errors='surrogatepass').decode('utf8')
+    return await send_chunks(update, context, text, build_buttons(buttons))
+
+
+async def send_text_stream(update: Update, context: ContextTypes.DEFAULT_TYPE, parts: AsyncIterator[str],
+                           buttons: dict, prefix: str = ""):
+    """
+    Send a streamed answer, as a single message while it fits.
+    The message is sent as soon as the first part arrives and then edited with the
+    text received so far, at most once per `STREAM_EDIT_INTERVAL` seconds to stay
+    within Telegram edit limits. Buttons are attached with the final edit.
+    When the text outgrows `MESSAGE_LIMIT`, the message is finished with its first
+    chunk and the rest continues in a new message, so the first chunks are
+    delivered while the rest of the answer is still being generated.
+    """
+    text = prefix
+    message = None
+    last_edit = 0.0
+    answered = False
+    async for part in parts:
+        text += part
+        answered = answered or bool(part.strip())
+        now = time.monotonic()
+        if len(text) > MESSAGE_LIMIT:
+            *finished, text = split_message(text)
+            for chunk in finished:
+                if message is None:
+                    await context.bot.send_message(
+                        chat_id=update.effective_message.chat_id,
+                        text=chunk,
+                        message_thread_id=update.effective_message.message_thread_id
+                    )
+                else:
+                    await _edit_text(message, chunk)
+                    message = None
+        if message is None:
+            if not text.strip():
+                # Telegram rejects empty messages
+                continue
+            message = await context.bot.send_message(
+                chat_id=update.effective_message.chat_id,
+                text=text,
+                message_thread_id=update.effective_message.message_thread_id
+            )
+            last_edit = now
+        elif now - last_edit >= STREAM_EDIT_INTERVAL:
+            await _edit_text(message, text)
+            last_edit = now
+
+    if not answered:
+        text = prefix + EMPTY_ANSWER_TEXT
+    if message is None:
+        return await send_text_buttons(update, context, text, buttons)
+    await _edit_text(message, text, build_buttons(buttons))
+    return message
+
+
+async def _edit_text(message: Message, text: str, reply_markup: InlineKeyboardMarkup | None = None):
+    try:
+        await message.edit_text(text, reply_markup=reply_markup)
+    except BadRequest as e:
+        # the text did not change since the last edit
+        if "not modified" not in str(e):
+            raise
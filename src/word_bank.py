@@ -0,0 +1,119 @@
+import hashlib
+import mmap
+import os
+import random
+from array import array
+from bisect import bisect_left, bisect_right
+
+from src.config import WORDS_PATH
+from src.resource_registry import RESOURCES_DIR
+
+# difficulty tiers as ranges of word length
+TIERS = {
+    "easy": (1, 5),
+    "medium": (6, 8),
+    "hard": (9, 255),
+}
+
+
+# rounds of the Feistel network of `permute`
+PERMUTATION_ROUNDS = 4
+
+
+def permute(index: int, size: int, seed: int) -> int:
+    """
+    Position of `index` in a pseudo-random permutation of `range(size)` given by `seed`.
+    The permutation is a Feistel network keyed by `seed` over the smallest even
+    number of bits that covers `size`; results outside the range are encrypted
+    again (cycle walking). It needs no memory, visits every position exactly
+    once and, unlike a fixed step, gives no pattern in the order of positions.
+    """
+    if size == 1:
+        return 0
+    half = ((size - 1).bit_length() + 1) // 2
+    mask = (1 << half) - 1
+    key = seed.to_bytes(8, "big")
+    value = index
+    while True:
+        left, right = value >> half, value & mask
+        for round_index in range(PERMUTATION_ROUNDS):
+            digest = hashlib.blake2b(right.to_bytes(8, "big"), digest_size=8, key=key + bytes([round_index])).digest()
+            left, right = right, left ^ (int.from_bytes(digest, "big") & mask)
+        value = (left << half) | right
+        if value < size:
+            return value
+
+
+class WordBank:
+    """
+    Words of the /english game, read from a text file with one word per line.
+    The file is memory-mapped and only the offsets of its lines are kept, sorted
+    by word length, so the words of a length or difficulty tier form a
+    contiguous range. Duplicates and phrases of several words are skipped.
+    The file is loaded by `load` or on the first draw.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mm = None
+        self._offsets = array("I")
+        self._lengths = array("B")
+
+    def __len__(self) -> int:
+        self.load()
+        return len(self._offsets)
+
+    def word(self, index: int) -> str:
+        self.load()
+        start = self._offsets[index]
+        end = self._mm.find(b"\n", start)
+        return self._mm[start:end if end != -1 else len(self._mm)].strip().lower().decode("ascii")
+
+    def range(self, tier: str | None = None) -> tuple[int, int]:
+        """Index range of the words of a difficulty tier, or of all words."""
+        self.load()
+        if tier is None:
+            return 0, len(self._offsets)
+        shortest, longest = TIERS[tier]
+        return bisect_left(self._lengths, shortest), bisect_right(self._lengths, longest)
+
+    def draw(self, bag: list | None, tier: str | None = None) -> tuple[str, list]:
+        """
+        Draw the next word of a shuffle bag.
+        `bag` is the `[tier, seed, offset]` state returned by the previous draw,
+        or None for a new one. Words repeat only after all words of the tier were drawn.
+        """
+        start, end = self.range(tier)
+        size = end - start
+        if size == 0:
+            raise LookupError(f"No words of the tier {tier}")
+        if not bag or bag[0] != tier or bag[2] >= size:
+            bag = [tier, random.getrandbits(64), 0]
+        _, seed, offset = bag
+        return self.word(start + permute(offset, size, seed)), [tier, seed, offset + 1]
+
+    def load(self) -> None:
+        if self._mm is not None:
+            return
+        with open(self.path, "rb") as file:
+            mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        entries = []
+        seen = set()
+        position = 0
+        while position < len(mm):
+            end = mm.find(b"\n", position)
+            if end == -1:
+                end = len(mm)
+            word = mm[position:end].strip().lower()
+            # single words of latin letters only
+            if word.isalpha() and len(word) <= 255 and word not in seen:
+                seen.add(word)
+                entries.append((len(word), position))
+            position = end + 1
+        entries.sort()
+        self._offsets = array("I", (offset for _, offset in entries))
+        self._lengths = array("B", (length for length, _ in entries))
+        self._mm = mm
+
+
+word_bank = WordBank(WORDS_PATH or os.path.join(RESOURCES_DIR, "words", "english.txt"))